@@ -9,16 +9,20 @@ ComfyUI 许可证管理器插件
 """
 
 try:
-    from .license_manager import LicenseValidator
-    from .web import setup_license_routes
+    from .license_manager import LicenseValidator, get_license_validator
+    from .web import setup_license_routes, get_asset_registry
+    from .license_middleware import license_middleware, install_route_table, handle_execution_event
+    from .startup_timing import startup_timer
 except ImportError:
     # 如果相对导入失败，使用绝对导入
     import sys
     import os
     current_dir = os.path.dirname(__file__)
     sys.path.append(current_dir)
-    from license_manager import LicenseValidator
-    from web import setup_license_routes
+    from license_manager import LicenseValidator, get_license_validator
+    from web import setup_license_routes, get_asset_registry
+    from license_middleware import license_middleware, install_route_table, handle_execution_event
+    from startup_timing import startup_timer
 
 # 导入插件信息
 WEB_DIRECTORY = "js"
@@ -31,113 +35,61 @@ __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS', 'WEB_DIRECTORY']
 try:
     from server import PromptServer
     import os
-    from aiohttp import web
     
     # 添加许可证路由
-    setup_license_routes(PromptServer.instance.app)
+    with startup_timer.phase("注册许可证路由"):
+        setup_license_routes(PromptServer.instance.app)
+    
+    # 注入许可证验证脚本后的主页只构建一次，源文件变化时才重新生成
+    def inject_license_script(content):
+        """在主页中注入卡密验证脚本"""
+        script_tag = b'<script src="/license_injection.js"></script>'
+        
+        if b'</head>' in content:
+            return content.replace(b'</head>', script_tag + b'\n</head>')
+        return content.replace(b'</body>', script_tag + b'\n</body>')
+    
+    def get_index_registry():
+        """首次请求主页时注册注入后的 index.html"""
+        asset_registry = get_asset_registry()
+        if "index.html" not in asset_registry.assets:
+            static_config = get_license_validator().config.get("static_assets", {})
+            with startup_timer.phase("构建主页"):
+                asset_registry.register(
+                    "index.html",
+                    os.path.join(PromptServer.instance.web_root, "index.html"),
+                    content_type='text/html; charset=utf-8',
+                    transform=inject_license_script,
+                    reload_interval=static_config.get("index_reload_interval", 2.0)
+                )
+        return asset_registry
     
     # 创建新的主页处理器，注入许可证验证脚本
     async def get_root_with_license_injection(request):
         """返回注入了卡密验证脚本的主页"""
-        # 获取原始web根目录
-        web_root = PromptServer.instance.web_root
-        index_path = os.path.join(web_root, "index.html")
-        
-        if os.path.exists(index_path):
-            with open(index_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 注入我们的脚本
-            script_tag = '<script src="/license_injection.js"></script>'
-            
-            if '</head>' in content:
-                content = content.replace('</head>', f'{script_tag}\n</head>')
-            else:
-                content = content.replace('</body>', f'{script_tag}\n</body>')
-            
-            response = web.Response(text=content, content_type='text/html')
-            response.headers['Cache-Control'] = 'no-cache'
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-            return response
-        else:
-            return web.Response(status=404)
+        return get_index_registry().response(request, "index.html")
     
     # 添加我们的主页路由（会覆盖默认的）
     PromptServer.instance.app.router.add_get('/', get_root_with_license_injection)
 
-    # 拦截关键API端点，确保需要许可证验证
-    original_prompt_handler = None
-    original_queue_handler = None
-
-    # 查找并替换现有的prompt处理器
-    for route in PromptServer.instance.app.router._resources:
-        if hasattr(route, '_path') and route._path == '/prompt':
-            for method_handler in route._routes:
-                if method_handler.method == 'POST':
-                    original_prompt_handler = method_handler._handler
-                    break
-
-    async def license_protected_prompt(request):
-        """需要许可证验证的prompt处理器"""
-        try:
-            # 检查请求中是否包含license_key
-            if request.content_type == 'application/json':
-                data = await request.json()
-                license_key = data.get('license_key')
-
-                if not license_key:
-                    return web.json_response({
-                        'error': '需要有效的许可证密钥',
-                        'code': 'LICENSE_REQUIRED'
-                    }, status=401)
-
-                # 验证许可证
-                from .license_manager import license_validator
-                is_valid, result = license_validator.validate_license(license_key)
-
-                if not is_valid:
-                    return web.json_response({
-                        'error': f'许可证验证失败: {result}',
-                        'code': 'LICENSE_INVALID'
-                    }, status=401)
-
-                # 移除license_key，避免传递给原始处理器
-                if 'license_key' in data:
-                    del data['license_key']
-
-                # 重新构造请求
-                import json
-                new_body = json.dumps(data).encode()
-                request._payload = new_body
-                request._body = new_body
-
-            # 调用原始处理器
-            if original_prompt_handler:
-                return await original_prompt_handler(request)
-            else:
-                return web.json_response({'error': '原始处理器未找到'}, status=500)
-
-        except Exception as e:
-            return web.json_response({
-                'error': f'处理请求时出错: {str(e)}',
-                'code': 'PROCESSING_ERROR'
-            }, status=500)
-
-    # 替换prompt处理器
-    if original_prompt_handler:
-        PromptServer.instance.app.router.add_post('/prompt', license_protected_prompt)
-        print("[ComfyUI-License-Manager] 已拦截 /prompt 端点")
-
-    # 同样拦截其他重要端点
-    async def license_protected_queue(request):
-        """需要许可证验证的队列处理器"""
-        # 这里可以添加队列相关的许可证检查
-        # 暂时允许通过，因为队列操作通常不需要额外验证
-        return web.json_response({'status': 'queue operations require license'}, status=401)
-
-    # 添加队列拦截（如果需要）
-    # PromptServer.instance.app.router.add_post('/queue', license_protected_queue)
+    # 由中间件统一检查 /prompt、/queue、/upload、/history 等接口的许可证
+    with startup_timer.phase("注册许可证中间件"):
+        install_route_table()
+        PromptServer.instance.app.middlewares.append(license_middleware)
+    print("[ComfyUI-License-Manager] 已启用许可证中间件")
+    
+    # 监听 ComfyUI 的执行事件，任务结束时释放该许可证的任务配额名额
+    with startup_timer.phase("挂接执行事件"):
+        original_send_sync = PromptServer.instance.send_sync
+        
+        def send_sync_with_quota(event, data, sid=None):
+            try:
+                handle_execution_event(event, data)
+            except Exception as e:
+                print(f"[ComfyUI-License-Manager] 处理执行事件失败: {e}")
+            return original_send_sync(event, data, sid)
+        
+        PromptServer.instance.send_sync = send_sync_with_quota
     
     print("[ComfyUI-License-Manager] 许可证系统已启动")
     print("[ComfyUI-License-Manager] 主页已注入卡密验证脚本")
@@ -148,6 +100,7 @@ except ImportError as e:
 except Exception as e:
     print(f"[ComfyUI-License-Manager] 设置错误: {e}")
 
+print(startup_timer.report())
 print("[ComfyUI-License-Manager] 插件加载完成")
 
 print("🔐 ComfyUI License Manager v1.0.0 已加载")
@@ -0,0 +1,228 @@
+"""
+ComfyUI License Manager 审计日志
+记录哪个许可证在何时执行了哪个请求（验证、使用、受保护接口的访问）
+
+record() 只把事件追加到内存中的有界环形缓冲区，不做任何 I/O；
+后台线程按间隔批量写入按大小轮转的 JSONL 文件：
+    audit-<首条事件毫秒时间戳>.jsonl
+查询时按文件名中的起始时间跳过不相关的文件，逐行读取，不会把整个文件读入内存
+
+缓冲区满时的策略（overflow）：
+    drop_oldest - 丢弃最早的事件（默认）
+    drop_newest - 丢弃新事件
+    block       - 阻塞调用线程最多 block_timeout 秒等待写入，超时后丢弃新事件；
+                  只阻塞没有运行事件循环的线程（use_license、命令行工具），
+                  aiohttp 处理器等事件循环中的调用按 drop_newest 处理，不会卡住事件循环
+"""
+
+import os
+import time
+import atexit
+import asyncio
+import threading
+from collections import deque
+
+try:
+    from . import fast_json
+except ImportError:
+    import fast_json
+
+FILE_PREFIX = "audit-"
+FILE_SUFFIX = ".jsonl"
+
+
+class AuditLog:
+    """有界缓冲 + 后台批量写入的审计日志"""
+    def __init__(self, directory, buffer_size=10000, overflow="drop_oldest", block_timeout=0.05,
+                 flush_interval=1.0, max_file_bytes=16 * 1024 * 1024, max_files=20):
+        if overflow not in ("drop_oldest", "drop_newest", "block"):
+            raise ValueError(f"未知的审计日志溢出策略: {overflow}")
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.dropped = 0
+        self.written = 0
+        self._buffer = deque()
+        self._not_full = threading.Condition(threading.Lock())
+        self._write_lock = threading.Lock()
+        self._file = None
+        self._file_size = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, event_type, **fields):
+        """记录一条事件（不做 I/O），返回是否写入缓冲区"""
+        fields["ts"] = time.time()
+        fields["event"] = event_type
+        buffer = self._buffer
+        if len(buffer) >= self.buffer_size:
+            if self.overflow == "drop_oldest":
+                try:
+                    buffer.popleft()
+                except IndexError:
+                    pass
+                self.dropped += 1
+            elif self.overflow == "drop_newest" or _in_event_loop() or not self._wait_not_full():
+                self.dropped += 1
+                return False
+        buffer.append(fields)
+        self._start()
+        return True
+
+    def _wait_not_full(self):
+        """block 策略：等待后台线程腾出空间"""
+        deadline = time.monotonic() + self.block_timeout
+        with self._not_full:
+            while len(self._buffer) >= self.buffer_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._not_full.wait(remaining)
+        return True
+
+    def _start(self):
+        """首条事件时启动后台写入线程"""
+        if self._thread is None:
+            with self._write_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="license-audit-log", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """把缓冲区中的事件批量写入文件"""
+        buffer = self._buffer
+        if not buffer:
+            return
+        with self._write_lock:
+            events = []
+            try:
+                while True:
+                    events.append(buffer.popleft())
+            except IndexError:
+                pass
+            with self._not_full:
+                self._not_full.notify_all()
+            if not events:
+                return
+            try:
+                data = b"\n".join([fast_json.dumps(event) for event in events]) + b"\n"
+                self._write(data, first_ts=events[0]["ts"])
+                self.written += len(events)
+            except OSError as e:
+                self.dropped += len(events)
+                print(f"[License Validator] 审计日志写入失败: {e}")
+
+    def _write(self, data, first_ts):
+        if self._file is None or self._file_size >= self.max_file_bytes:
+            self._rotate(first_ts)
+        self._file.write(data)
+        self._file.flush()
+        self._file_size += len(data)
+
+    def _rotate(self, first_ts):
+        """开始新文件，并删除超出数量的旧文件"""
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{FILE_PREFIX}{int(first_ts * 1000)}{FILE_SUFFIX}")
+        self._file = open(path, "ab")
+        self._file_size = self._file.tell()
+        for start, old_path in self.list_files()[:-self.max_files]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def list_files(self):
+        """按起始时间排序的 [(起始时间戳, 路径)]"""
+        files = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return files
+        for name in names:
+            if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX):
+                try:
+                    start = int(name[len(FILE_PREFIX):-len(FILE_SUFFIX)]) / 1000
+                except ValueError:
+                    continue
+                files.append((start, os.path.join(self.directory, name)))
+        files.sort()
+        return files
+
+    def query(self, start=None, end=None, **filters):
+        """
+        逐行读取时间范围 [start, end) 内的事件，filters 为字段等值过滤
+        返回生成器，每次产出一个事件字典
+        """
+        files = self.list_files()
+        for index, (file_start, path) in enumerate(files):
+            # 文件覆盖 [起始时间, 下一个文件的起始时间)，写入时的批次边界留一秒余量
+            if end is not None and file_start >= end + 1:
+                break
+            next_start = files[index + 1][0] if index + 1 < len(files) else None
+            if start is not None and next_start is not None and next_start < start - 1:
+                continue
+            try:
+                with open(path, "rb") as f:
+                    for line in f:
+                        try:
+                            event = fast_json.loads(line)
+                        except ValueError:
+                            continue
+                        ts = event.get("ts", 0)
+                        if (start is not None and ts < start) or (end is not None and ts >= end):
+                            continue
+                        if all(str(event.get(key)) == value for key, value in filters.items()):
+                            yield event
+            except OSError:
+                continue
+
+    def stats(self):
+        return {"buffered": len(self._buffer), "dropped": self.dropped, "written": self.written}
+
+    def close(self):
+        """停止后台线程并写入剩余事件"""
+        self._stop.set()
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _in_event_loop():
+    """当前线程是否正在运行事件循环（block 策略不能在其中等待）"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def create_audit_log(config, base_dir=""):
+    """根据 license_config.json 的 audit_log 配置创建审计日志，未启用时返回 None"""
+    config = config or {}
+    if not config.get("enabled", True):
+        return None
+    directory = config.get("directory", "audit_logs")
+    if not os.path.isabs(directory):
+        directory = os.path.join(base_dir, directory)
+    return AuditLog(
+        directory,
+        buffer_size=config.get("buffer_size", 10000),
+        overflow=config.get("overflow", "drop_oldest"),
+        block_timeout=config.get("block_timeout", 0.05),
+        flush_interval=config.get("flush_interval", 1.0),
+        max_file_bytes=config.get("max_file_bytes", 16 * 1024 * 1024),
+        max_files=config.get("max_files", 20)
+    )
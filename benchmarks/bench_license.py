@@ -0,0 +1,371 @@
+"""
+ComfyUI License Manager 性能基准
+
+测量两部分：
+1. LicenseValidator 的 validate_license / use_license / get_license_info
+   对有效、已过期、已用尽、无效卡密的吞吐量（分别在缓存开启和关闭时）
+2. 用模拟的 PromptServer 启动插件，通过 aiohttp 测试客户端请求
+   /prompt（1KB ~ 10MB 工作流）、/license/validate 和静态资源路由
+
+输出每个场景的 ops/s、p50、p99，可保存为 JSON 基线并在之后的运行中对比：
+
+    python benchmarks/bench_license.py --save
+    python benchmarks/bench_license.py --compare
+    python benchmarks/bench_license.py --filter prompt --duration 2
+
+运行时使用临时生成的加密密钥和内存账本，不会读取或修改插件目录中的配置。
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import asyncio
+import argparse
+import platform
+import tempfile
+import importlib.util
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from cryptography.fernet import Fernet
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "comfyui_license_manager"
+# 配置和卡密中的功能列表（紧凑格式卡密按此位序编码）
+BENCH_FEATURES = ["🎨 AI图像生成"]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# 工作流请求体大小
+WORKFLOW_SIZES = (
+    ("1KB", 1024),
+    ("64KB", 64 * 1024),
+    ("1MB", 1024 * 1024),
+    ("10MB", 10 * 1024 * 1024),
+)
+
+
+# ---------------------------------------------------------------------------
+# 计时与统计
+# ---------------------------------------------------------------------------
+
+def summarize(name, samples, elapsed):
+    """根据每次操作的耗时（秒）计算 ops/s 与分位数"""
+    samples.sort()
+    count = len(samples)
+    return {
+        "name": name,
+        "count": count,
+        "ops_per_sec": count / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": samples[int(count * 0.50)] * 1000 if count else 0.0,
+        "p99_ms": samples[min(count - 1, int(count * 0.99))] * 1000 if count else 0.0,
+    }
+
+
+def bench_sync(name, func, duration, min_iterations=5):
+    """重复调用同步函数，直到达到时长且至少执行 min_iterations 次"""
+    perf_counter = time.perf_counter
+    samples = []
+    start = perf_counter()
+    deadline = start + duration
+    while True:
+        t0 = perf_counter()
+        func()
+        t1 = perf_counter()
+        samples.append(t1 - t0)
+        if t1 >= deadline and len(samples) >= min_iterations:
+            break
+    return summarize(name, samples, perf_counter() - start)
+
+
+async def bench_async(name, func, duration, min_iterations=5):
+    """bench_sync 的异步版本"""
+    perf_counter = time.perf_counter
+    samples = []
+    start = perf_counter()
+    deadline = start + duration
+    while True:
+        t0 = perf_counter()
+        await func()
+        t1 = perf_counter()
+        samples.append(t1 - t0)
+        if t1 >= deadline and len(samples) >= min_iterations:
+            break
+    return summarize(name, samples, perf_counter() - start)
+
+
+# ---------------------------------------------------------------------------
+# 测试环境
+# ---------------------------------------------------------------------------
+
+class StubPromptServer:
+    """模拟 ComfyUI 的 PromptServer，只提供插件用到的属性"""
+    instance = None
+
+    def __init__(self, web_root):
+        self.app = web.Application()
+        self.app.router.add_post('/prompt', stub_prompt_handler)
+        self.web_root = web_root
+
+    def send_sync(self, event, data, sid=None):
+        pass
+
+
+async def stub_prompt_handler(request):
+    """模拟 ComfyUI 的 /prompt：读取并解析整个工作流"""
+    data = await request.json()
+    return web.json_response({"prompt_id": "bench", "number": len(data.get("prompt", {})), "node_errors": {}})
+
+
+def write_config(directory, cache_enabled=True):
+    """生成基准测试使用的配置文件，返回 (路径, 加密密钥)"""
+    key = Fernet.generate_key().decode()
+    config = {
+        "encryption_key": key,
+        "features": BENCH_FEATURES,
+        "cache": {"enabled": cache_enabled},
+        "negative_cache": {"enabled": cache_enabled},
+        "rate_limit": {"enabled": False},
+        "prompt_quota": {"enabled": False},
+        "config_reload": {"enabled": False},
+        "usage_ledger": {"backend": "memory"},
+    }
+    path = os.path.join(directory, "license_config_%s.json" % ("cached" if cache_enabled else "uncached"))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    return path, key
+
+
+def make_tokens(key, license_manager):
+    """生成各种状态的卡密（valid_compact 为紧凑格式，其余为 JSON 格式）"""
+    fernet = Fernet(key.encode())
+    now = int(time.time())
+
+    def encrypt(compact=False, **fields):
+        data = {
+            "user_id": "bench",
+            "expire_time": now + 86400,
+            "max_uses": -1,
+            "current_uses": 0,
+            "features": list(BENCH_FEATURES),
+        }
+        data.update(fields)
+        if compact:
+            payload = license_manager.encode_license_payload(data, BENCH_FEATURES)
+        else:
+            payload = json.dumps(data).encode()
+        return fernet.encrypt(payload).decode()
+
+    return {
+        "valid": encrypt(user_id="bench-valid"),
+        "valid_compact": encrypt(compact=True, user_id="bench-valid-compact"),
+        "expired": encrypt(user_id="bench-expired", expire_time=now - 86400),
+        "exhausted": encrypt(user_id="bench-exhausted", max_uses=1, current_uses=1),
+        "garbage": "gAAAAA" + "x" * 180,
+    }
+
+
+def make_workflow(size):
+    """生成大约 size 字节的 ComfyUI 风格工作流"""
+    node = {
+        "class_type": "CLIPTextEncode",
+        "inputs": {"text": "a photo of a cat, " * 4, "clip": ["4", 1]},
+    }
+    node_size = len(json.dumps(node)) + 8
+    prompt = {str(i): node for i in range(max(1, size // node_size))}
+    return {"prompt": prompt, "client_id": "bench"}
+
+
+def load_plugin(web_root):
+    """安装模拟的 server 模块并以包的形式导入插件"""
+    StubPromptServer.instance = StubPromptServer(web_root)
+    server = types.ModuleType("server")
+    server.PromptServer = StubPromptServer
+    sys.modules["server"] = server
+
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, os.path.join(PLUGIN_DIR, "__init__.py"),
+        submodule_search_locations=[PLUGIN_DIR]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# ---------------------------------------------------------------------------
+# 基准场景
+# ---------------------------------------------------------------------------
+
+def run_validator_benchmarks(license_manager, workdir, duration, selected):
+    results = []
+    for cache_enabled in (True, False):
+        config_path, key = write_config(workdir, cache_enabled)
+        validator = license_manager.LicenseValidator(config_path)
+        tokens = make_tokens(key, license_manager)
+        mode = "cached" if cache_enabled else "uncached"
+        for method in ("validate_license", "use_license", "get_license_info"):
+            func = getattr(validator, method)
+            for state, token in tokens.items():
+                name = f"validator/{method}/{state}/{mode}"
+                if selected(name):
+                    results.append(bench_sync(name, lambda: func(token), duration))
+                    print_result(results[-1])
+        validator.shutdown()
+    return results
+
+
+async def run_http_benchmarks(plugin, license_manager, workdir, duration, selected):
+    config_path, key = write_config(workdir)
+    license_manager._license_validator = license_manager.LicenseValidator(config_path)
+    tokens = make_tokens(key, license_manager)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024, middlewares=[plugin.license_middleware])
+    plugin.setup_license_routes(app)
+    app.router.add_post('/prompt', stub_prompt_handler)
+    app.router.add_get('/', plugin.get_root_with_license_injection)
+
+    results = []
+
+    async def run(name, func):
+        if selected(name):
+            results.append(await bench_async(name, func, duration))
+            print_result(results[-1])
+
+    async with TestClient(TestServer(app)) as client:
+        async def request(method, path, expected, **kwargs):
+            async with client.request(method, path, **kwargs) as response:
+                await response.read()
+                if response.status != expected:
+                    raise RuntimeError(f"{method} {path} 返回 {response.status}，预期 {expected}")
+
+        # 许可证验证接口
+        for state in ("valid", "garbage"):
+            body = json.dumps({"license_key": tokens[state]}).encode()
+            expected = 200 if state == "valid" else 401
+            await run(f"http/license_validate/{state}", lambda body=body, expected=expected: request(
+                "POST", "/license/validate", expected, data=body, headers={"Content-Type": "application/json"}
+            ))
+
+        # 不同大小的工作流：卡密放在请求头中 / 旧版放在请求体中 / 无效卡密
+        for label, size in WORKFLOW_SIZES:
+            workflow = make_workflow(size)
+            header_body = json.dumps(workflow).encode()
+            legacy_body = json.dumps(dict(workflow, license_key=tokens["valid"])).encode()
+            json_headers = {"Content-Type": "application/json"}
+            header_auth = dict(json_headers, **{"X-License-Key": tokens["valid"]})
+            garbage_auth = dict(json_headers, **{"X-License-Key": tokens["garbage"]})
+
+            await run(f"http/prompt/header/{label}", lambda body=header_body, headers=header_auth: request(
+                "POST", "/prompt", 200, data=body, headers=headers
+            ))
+            await run(f"http/prompt/body/{label}", lambda body=legacy_body, headers=json_headers: request(
+                "POST", "/prompt", 200, data=body, headers=headers
+            ))
+            await run(f"http/prompt/invalid/{label}", lambda body=header_body, headers=garbage_auth: request(
+                "POST", "/prompt", 401, data=body, headers=headers
+            ))
+
+        # 静态资源：完整响应、gzip、ETag 命中
+        for name, path in (("injection_js", "/license_injection.js"),
+                           ("style_css", "/license_static/style.css"),
+                           ("index", "/")):
+            async with client.get(path) as response:
+                await response.read()
+                etag = response.headers.get("ETag")
+            await run(f"http/static/{name}/identity", lambda path=path: request(
+                "GET", path, 200, headers={"Accept-Encoding": "identity"}
+            ))
+            await run(f"http/static/{name}/gzip", lambda path=path: request(
+                "GET", path, 200, headers={"Accept-Encoding": "gzip"}
+            ))
+            if etag:
+                await run(f"http/static/{name}/not_modified", lambda path=path, etag=etag: request(
+                    "GET", path, 304, headers={"If-None-Match": etag}
+                ))
+
+    license_manager._license_validator.shutdown()
+    return results
+
+
+# ---------------------------------------------------------------------------
+# 输出与基线
+# ---------------------------------------------------------------------------
+
+def print_result(result):
+    line = f"{result['name']:<48} {result['ops_per_sec']:>12.1f} ops/s  p50 {result['p50_ms']:>9.3f}ms  p99 {result['p99_ms']:>9.3f}ms"
+    print(line, flush=True)
+
+
+def compare(results, baseline, threshold):
+    """与基线比较 ops/s，返回退步超过阈值的场景"""
+    previous = {item["name"]: item for item in baseline.get("results", [])}
+    regressions = []
+    print(f"\n与基线对比（{baseline.get('created', '未知时间')}，阈值 {threshold:.0%}）:")
+    for result in results:
+        old = previous.get(result["name"])
+        if old is None or not old["ops_per_sec"]:
+            continue
+        change = result["ops_per_sec"] / old["ops_per_sec"] - 1
+        marker = ""
+        if change < -threshold:
+            marker = "  <-- 退步"
+            regressions.append(result["name"])
+        print(f"{result['name']:<48} {old['ops_per_sec']:>12.1f} -> {result['ops_per_sec']:>12.1f} ops/s  {change:+7.1%}{marker}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ComfyUI License Manager 性能基准")
+    parser.add_argument("--duration", type=float, default=1.0, help="每个场景的运行时长（秒）")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的场景")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument("--save", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--compare", action="store_true", help="与基线对比，有退步时以状态码 1 退出")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定为退步的 ops/s 下降比例")
+    args = parser.parse_args(argv)
+
+    def selected(name):
+        return args.filter in name
+
+    workdir = tempfile.mkdtemp(prefix="license_bench_")
+    web_root = os.path.join(workdir, "web")
+    os.makedirs(web_root)
+    with open(os.path.join(web_root, "index.html"), "w", encoding="utf-8") as f:
+        f.write("<html><head><title>ComfyUI</title></head><body>" + "<div></div>" * 2000 + "</body></html>")
+
+    plugin = load_plugin(web_root)
+    license_manager = sys.modules[PACKAGE_NAME + ".license_manager"]
+
+    print(f"\nPython {platform.python_version()} / {platform.platform()} / JSON: {plugin.fast_json.BACKEND}\n")
+    results = run_validator_benchmarks(license_manager, workdir, args.duration, selected)
+    results += asyncio.run(run_http_benchmarks(plugin, license_manager, workdir, args.duration, selected))
+
+    exit_code = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"\n基线文件不存在: {args.baseline}")
+        else:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                regressions = compare(results, json.load(f), args.threshold)
+            if regressions:
+                print(f"\n{len(regressions)} 个场景退步超过 {args.threshold:.0%}")
+                exit_code = 1
+
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "duration": args.duration,
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.baseline}")
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""
+ComfyUI License Manager JSON 后端
+安装了 orjson 时使用 orjson，否则回退到标准库 json
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+
+    def loads(data):
+        """解析 JSON（接受 bytes 或 str）"""
+        return orjson.loads(data)
+
+    def dumps(obj):
+        """序列化为 JSON bytes"""
+        return orjson.dumps(obj)
+else:
+    BACKEND = "json"
+
+    def loads(data):
+        """解析 JSON（接受 bytes 或 str）"""
+        return json.loads(data)
+
+    def dumps(obj):
+        """序列化为 JSON bytes"""
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
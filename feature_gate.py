@@ -0,0 +1,72 @@
+"""
+ComfyUI License Manager 功能节点限制
+license_config.json 的 feature_nodes 把功能名映射到 ComfyUI 节点类型：
+    {"🎥 视频处理": ["VHS_LoadVideo", "VHS_VideoCombine"], ...}
+工作流中使用了某个功能的节点、而许可证的 features 不包含该功能时拒绝提交；
+未出现在任何功能中的节点不受限制
+
+配置加载时编译为两张表：功能 -> 位、节点类型 -> 允许它的功能位掩码；
+许可证的 features 只在第一次出现时转换为位掩码，检查工作流时只需遍历一次节点的 class_type
+"""
+
+
+class FeatureIndex:
+    """功能 -> 节点类型的预编译索引"""
+    # 最多缓存的许可证功能组合数量
+    MASK_CACHE_SIZE = 4096
+
+    def __init__(self, feature_nodes=None):
+        self.feature_bits = {}
+        self.node_masks = {}
+        for bit, (feature, node_types) in enumerate((feature_nodes or {}).items()):
+            if isinstance(node_types, str) or not all(isinstance(node_type, str) for node_type in node_types):
+                raise ValueError(f"feature_nodes 中 {feature} 的节点列表格式错误")
+            self.feature_bits[feature] = 1 << bit
+            for node_type in node_types:
+                self.node_masks[node_type] = self.node_masks.get(node_type, 0) | (1 << bit)
+        self.all_features = (1 << len(self.feature_bits)) - 1
+        self._license_masks = {}
+
+    @classmethod
+    def from_config(cls, feature_nodes):
+        """根据 license_config.json 的 feature_nodes 配置编译索引"""
+        if feature_nodes is not None and not isinstance(feature_nodes, dict):
+            raise ValueError("feature_nodes 必须是 功能名 -> 节点类型列表 的映射")
+        return cls(feature_nodes)
+
+    def __bool__(self):
+        return bool(self.node_masks)
+
+    def license_mask(self, features):
+        """许可证 features 列表对应的位掩码"""
+        key = tuple(features or ())
+        mask = self._license_masks.get(key)
+        if mask is None:
+            mask = 0
+            for feature in key:
+                mask |= self.feature_bits.get(feature, 0)
+            if len(self._license_masks) >= self.MASK_CACHE_SIZE:
+                self._license_masks.clear()
+            self._license_masks[key] = mask
+        return mask
+
+    def denied_nodes(self, prompt, mask):
+        """返回工作流中许可证无权使用的节点类型（集合），prompt 为 节点ID -> 节点 的映射"""
+        node_masks = self.node_masks
+        denied = set()
+        for node in prompt.values():
+            if not isinstance(node, dict):
+                continue
+            class_type = node.get('class_type')
+            # 格式错误的节点交给 ComfyUI 自己的校验
+            node_mask = node_masks.get(class_type) if isinstance(class_type, str) else None
+            if node_mask is not None and not node_mask & mask:
+                denied.add(class_type)
+        return denied
+
+    def features_for(self, node_types):
+        """可以解锁这些节点类型的功能名"""
+        mask = 0
+        for node_type in node_types:
+            mask |= self.node_masks.get(node_type, 0)
+        return [feature for feature, bit in self.feature_bits.items() if bit & mask]
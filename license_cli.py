@@ -0,0 +1,222 @@
+"""
+ComfyUI License Manager 命令行验证工具
+不启动 ComfyUI，直接用 LicenseValidator 批量验证或查看卡密
+
+    python license_cli.py validate keys.txt
+    python license_cli.py info keys.txt --format ndjson --output report.ndjson
+    cat keys.txt | python license_cli.py validate --workers 8
+
+输入文件每行一个卡密（空行和 # 开头的行跳过），"-" 或省略表示从标准输入读取。
+解密在进程池中并行执行，吊销、使用次数等检查在主进程中完成（与 executor.type 为 process 时相同），
+结果按输入顺序逐行输出为 CSV 或 NDJSON，汇总信息输出到标准错误。
+输出中只包含卡密摘要，不包含卡密本身。
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+import contextlib
+import multiprocessing
+
+try:
+    from .license_manager import (
+        LicenseValidator, LicenseStatus, DEFAULT_CONFIG_PATH, decrypt_license_token, license_digest
+    )
+    from .usage_ledger import license_id_of
+except ImportError:
+    from license_manager import (
+        LicenseValidator, LicenseStatus, DEFAULT_CONFIG_PATH, decrypt_license_token, license_digest
+    )
+    from usage_ledger import license_id_of
+
+# 汇总中单独统计的结果，其余都计为 invalid
+SUMMARY_STATUSES = {
+    LicenseStatus.VALID: "valid",
+    LicenseStatus.EXPIRED: "expired",
+    LicenseStatus.EXHAUSTED: "exhausted",
+}
+
+VALIDATE_FIELDS = ("line", "license", "valid", "code", "user_id", "message")
+INFO_FIELDS = ("line", "license", "valid", "code", "user_id", "features", "current_uses", "max_uses",
+               "remaining_uses", "expire_time", "expire_time_str", "is_expired", "message")
+
+# 进程池工作进程中的解密参数（由 _init_worker 设置）
+_worker_key_specs = None
+_worker_feature_table = ()
+
+
+def _init_worker(key_specs, feature_table):
+    global _worker_key_specs, _worker_feature_table
+    _worker_key_specs = key_specs
+    _worker_feature_table = feature_table
+
+
+def _decrypt(item):
+    """在工作进程中解密一行卡密，返回 (行号, 卡密, 解密结果)"""
+    line_number, license_key = item
+    return line_number, license_key, decrypt_license_token(_worker_key_specs, license_key, _worker_feature_table)
+
+
+def read_keys(stream):
+    """逐行读取卡密，产出 (行号, 卡密)"""
+    for line_number, line in enumerate(stream, 1):
+        license_key = line.strip()
+        if license_key and not license_key.startswith("#"):
+            yield line_number, license_key
+
+
+def bounded(items, semaphore):
+    """
+    Pool.imap 会一次性读完输入，用信号量限制已读取但尚未输出的卡密数量，
+    大文件的内存占用只与窗口大小有关
+    """
+    for item in items:
+        semaphore.acquire()
+        yield item
+
+
+def decrypted_license_ids(batch):
+    """一批解密结果中成功解密的许可证标识"""
+    license_ids = []
+    for _, license_key, (key_id, payload) in batch:
+        if key_id is not None:
+            try:
+                license_ids.append(license_id_of(payload, license_digest(license_key)))
+            except (TypeError, AttributeError):
+                # 缺少字段的许可证由验证器报告为格式错误
+                continue
+    return license_ids
+
+
+def result_row(command, validator, line_number, license_key, result):
+    """把验证结果转换为一行输出"""
+    row = {
+        "line": line_number,
+        "license": license_digest(license_key).hex(),
+        "valid": result.ok,
+        "code": result.code,
+        "user_id": None,
+        "message": result.message
+    }
+    if result.ok:
+        row["user_id"] = result.data["user_id"]
+        if command == "info":
+            row.update(validator._format_license_info(result.data))
+    return row
+
+
+class CsvWriter:
+    def __init__(self, stream, fields):
+        self._writer = csv.DictWriter(stream, fieldnames=fields, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write(self, row):
+        if isinstance(row.get("features"), list):
+            row["features"] = ";".join(row["features"])
+        self._writer.writerow(row)
+
+
+class NdjsonWriter:
+    def __init__(self, stream, fields):
+        self._stream = stream
+        self._fields = fields
+
+    def write(self, row):
+        self._stream.write(json.dumps({field: row.get(field) for field in self._fields}, ensure_ascii=False) + "\n")
+
+
+def run(args, output):
+    """验证全部卡密并写出结果，返回汇总计数"""
+    input_stream = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8-sig")
+    try:
+        validator = LicenseValidator(args.config)
+    except BaseException:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        raise
+    state = validator._state
+    fields = INFO_FIELDS if args.command == "info" else VALIDATE_FIELDS
+    counts = {"valid": 0, "expired": 0, "exhausted": 0, "invalid": 0}
+
+    pool = None
+    try:
+        writer = (NdjsonWriter if args.format == "ndjson" else CsvWriter)(output, fields)
+        keys = read_keys(input_stream)
+        window = threading.Semaphore(args.workers * args.chunksize * 4)
+        if args.workers > 1:
+            pool = multiprocessing.Pool(
+                args.workers, initializer=_init_worker, initargs=(state.key_specs, state.feature_table)
+            )
+            decrypted = pool.imap(_decrypt, bounded(keys, window), chunksize=args.chunksize)
+        else:
+            _init_worker(state.key_specs, state.feature_table)
+            decrypted = map(_decrypt, bounded(keys, window))
+
+        ledger = validator.usage_ledger
+        while True:
+            batch = list(itertools.islice(decrypted, args.chunksize))
+            if not batch:
+                break
+            for _ in batch:
+                window.release()
+            # 账本中的使用次数按批读取，而不是每个卡密查询一次后端
+            if ledger is not None:
+                ledger.prefetch(decrypted_license_ids(batch))
+            for line_number, license_key, decrypted_result in batch:
+                result = validator.validate_decrypted(license_key, decrypted_result)
+                counts[SUMMARY_STATUSES.get(result.status, "invalid")] += 1
+                writer.write(result_row(args.command, validator, line_number, license_key, result))
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        validator.shutdown()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ComfyUI License Manager 命令行验证工具")
+    parser.add_argument("command", choices=("validate", "info"), help="validate: 验证；info: 验证并输出卡密信息")
+    parser.add_argument("input", nargs="?", default="-", help="卡密文件，每行一个，- 表示标准输入")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, help="license_config.json 路径")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv", help="输出格式")
+    parser.add_argument("--output", default="-", help="输出文件，- 表示标准输出")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="解密进程数，1 表示在当前进程中解密")
+    parser.add_argument("--chunksize", type=int, default=256, help="每次分给工作进程的卡密数量")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.chunksize < 1:
+        parser.error("--workers 和 --chunksize 必须大于 0")
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    start = time.perf_counter()
+    try:
+        # 验证器的提示信息输出到标准错误，避免混入标准输出中的结果
+        with contextlib.redirect_stdout(sys.stderr):
+            counts = run(args, output)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    total = sum(counts.values())
+    print(
+        f"共 {total} 个卡密: 有效 {counts['valid']}，已过期 {counts['expired']}，"
+        f"已用尽 {counts['exhausted']}，无效 {counts['invalid']}；"
+        f"耗时 {elapsed:.2f}s，{total / elapsed if elapsed > 0 else 0:.0f} 个/秒",
+        file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,24 +10,571 @@ ComfyUI License Manager 核心模块 - 服务器端验证器
 """
 
 import os
+import copy
 import json
 import time
+import asyncio
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime
-from cryptography.fernet import Fernet
+from enum import Enum
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+
+try:
+    from .usage_ledger import create_usage_ledger, license_id_of
+    from .state_backend import create_state_backend
+    from .revocation import RevocationList
+    from .feature_gate import FeatureIndex
+    from .license_payload import decode_license_payload, encode_license_payload, is_compact_payload
+    from .audit_log import create_audit_log
+    from .startup_timing import startup_timer
+    from .license_metrics import metrics
+    from .session_tokens import SESSION_PREFIX, derive_session_secret, sign_session, verify_session
+except ImportError:
+    from usage_ledger import create_usage_ledger, license_id_of
+    from state_backend import create_state_backend
+    from revocation import RevocationList
+    from feature_gate import FeatureIndex
+    from license_payload import decode_license_payload, encode_license_payload, is_compact_payload
+    from audit_log import create_audit_log
+    from startup_timing import startup_timer
+    from license_metrics import metrics
+    from session_tokens import SESSION_PREFIX, derive_session_secret, sign_session, verify_session
+
+
+def license_digest(license_key):
+    """计算许可证密钥的摘要，用作缓存键（不保存原始密钥）"""
+    return hashlib.blake2b(license_key.encode(), digest_size=16).digest()
+
+
+def parse_encryption_keys(config):
+    """
+    读取配置中的加密密钥列表，返回 ((密钥ID, 密钥), ...)，第一个为主密钥
+    encryption_keys 支持 {"id": ..., "key": ...} 或纯字符串；未配置时使用 encryption_key
+    """
+    key_specs = []
+    for index, item in enumerate(config.get("encryption_keys") or []):
+        if isinstance(item, str):
+            key_specs.append((f"k{index}", item))
+        else:
+            key_specs.append((str(item.get("id") or f"k{index}"), item["key"]))
+    if not key_specs and config.get("encryption_key"):
+        key_specs.append(("default", config["encryption_key"]))
+    for key_id, _ in key_specs:
+        if "." in key_id:
+            raise ValueError(f"密钥ID不能包含'.': {key_id}")
+        if f"{key_id}." == SESSION_PREFIX:
+            raise ValueError(f"密钥ID与会话令牌前缀冲突: {key_id}")
+    return tuple(key_specs)
+
+
+class LicenseStatus(Enum):
+    """许可证验证结果代码（客户端可据此分支处理）"""
+    VALID = "LICENSE_VALID"
+    EMPTY = "LICENSE_EMPTY"
+    DECRYPT_FAILED = "LICENSE_DECRYPT_FAILED"
+    UNKNOWN_KEY_ID = "LICENSE_UNKNOWN_KEY_ID"
+    MALFORMED = "LICENSE_MALFORMED"
+    MISSING_FIELD = "LICENSE_MISSING_FIELD"
+    EXPIRED = "LICENSE_EXPIRED"
+    EXHAUSTED = "LICENSE_EXHAUSTED"
+    UPDATE_FAILED = "LICENSE_UPDATE_FAILED"
+    SESSION_INVALID = "LICENSE_SESSION_INVALID"
+    SESSION_EXPIRED = "LICENSE_SESSION_EXPIRED"
+    REVOKED = "LICENSE_REVOKED"
+
+
+# 面向用户的提示信息，只在 HTTP 响应时渲染
+LICENSE_MESSAGES = {
+    LicenseStatus.VALID: "验证成功",
+    LicenseStatus.EMPTY: "许可证密钥不能为空",
+    LicenseStatus.DECRYPT_FAILED: "许可证验证失败: {detail}",
+    LicenseStatus.UNKNOWN_KEY_ID: "许可证验证失败: 未知的密钥ID: {detail}",
+    LicenseStatus.MALFORMED: "许可证验证失败: {detail}",
+    LicenseStatus.MISSING_FIELD: "许可证格式错误：缺少{detail}字段",
+    LicenseStatus.EXPIRED: "许可证已过期",
+    LicenseStatus.EXHAUSTED: "许可证使用次数已耗尽",
+    LicenseStatus.UPDATE_FAILED: "许可证更新失败: {detail}",
+    LicenseStatus.SESSION_INVALID: "会话令牌无效",
+    LicenseStatus.SESSION_EXPIRED: "会话已过期，请重新验证许可证",
+    LicenseStatus.REVOKED: "许可证已被吊销",
+}
+
+# 结果代码对应的指标分类
+METRIC_OUTCOMES = {
+    LicenseStatus.VALID: "valid",
+    LicenseStatus.EMPTY: "malformed",
+    LicenseStatus.DECRYPT_FAILED: "decrypt_failure",
+    LicenseStatus.UNKNOWN_KEY_ID: "decrypt_failure",
+    LicenseStatus.MALFORMED: "malformed",
+    LicenseStatus.MISSING_FIELD: "malformed",
+    LicenseStatus.EXPIRED: "expired",
+    LicenseStatus.EXHAUSTED: "exhausted",
+    LicenseStatus.SESSION_INVALID: "session_invalid",
+    LicenseStatus.SESSION_EXPIRED: "session_expired",
+    LicenseStatus.REVOKED: "revoked",
+}
+
+
+class LicenseResult:
+    """
+    许可证操作结果：状态代码 + 数据/错误细节
+    仍支持 `is_valid, result = ...` 的旧式解包（失败时 result 为提示信息）
+    验证通过时 license_id 为账本和任务配额使用的许可证标识（见 usage_ledger.license_id_of）
+    """
+    __slots__ = ("status", "data", "detail", "license_id")
+
+    def __init__(self, status, data=None, detail=None, license_id=None):
+        self.status = status
+        self.data = data
+        self.detail = detail
+        self.license_id = license_id
+
+    @property
+    def ok(self):
+        return self.status is LicenseStatus.VALID
+
+    @property
+    def code(self):
+        return self.status.value
+
+    @property
+    def message(self):
+        """渲染面向用户的提示信息"""
+        return LICENSE_MESSAGES[self.status].format(detail="" if self.detail is None else self.detail)
+
+    def __iter__(self):
+        yield self.ok
+        yield self.data if self.ok else self.message
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    def __repr__(self):
+        return f"LicenseResult({self.status.name}, data={self.data!r}, detail={self.detail!r})"
+
+
+# 不带细节的失败结果可以复用，拒绝路径上不再分配对象
+RESULT_EMPTY = LicenseResult(LicenseStatus.EMPTY)
+RESULT_EXPIRED = LicenseResult(LicenseStatus.EXPIRED)
+RESULT_EXHAUSTED = LicenseResult(LicenseStatus.EXHAUSTED)
+RESULT_SESSION_INVALID = LicenseResult(LicenseStatus.SESSION_INVALID)
+RESULT_SESSION_EXPIRED = LicenseResult(LicenseStatus.SESSION_EXPIRED)
+RESULT_REVOKED = LicenseResult(LicenseStatus.REVOKED)
+
+
+class UnknownKeyId(ValueError):
+    """许可证前缀中的密钥ID不存在"""
+
+
+def decrypt_with_keys(fernet_by_id, fernets, license_key):
+    """
+    用密钥列表解密许可证，返回 (密钥ID, 明文)
+    带 "<密钥ID>." 前缀的许可证直接使用对应密钥，否则按顺序逐个尝试
+    """
+    key_id, sep, token = license_key.partition(".")
+    if sep:
+        fernet = fernet_by_id.get(key_id)
+        if fernet is None:
+            raise UnknownKeyId(key_id)
+        return key_id, fernet.decrypt(token.encode())
+    
+    token = license_key.encode()
+    for key_id, fernet in fernets:
+        try:
+            return key_id, fernet.decrypt(token)
+        except InvalidToken:
+            continue
+    raise InvalidToken
+
+
+def decrypt_license_token(key_specs, license_key, feature_table=()):
+    """
+    解密许可证（供进程池调用的模块级函数）
+    返回 (密钥ID, license_data)，失败时返回 (None, LicenseResult)
+    """
+    fernets = _worker_fernets.get(key_specs)
+    if fernets is None:
+        fernets = _worker_fernets[key_specs] = [(key_id, Fernet(key.encode())) for key_id, key in key_specs]
+    try:
+        key_id, decrypted_data = decrypt_with_keys(dict(fernets), fernets, license_key)
+    except UnknownKeyId as e:
+        return None, LicenseResult(LicenseStatus.UNKNOWN_KEY_ID, detail=str(e))
+    except Exception as e:
+        return None, LicenseResult(LicenseStatus.DECRYPT_FAILED, detail=str(e))
+    try:
+        return key_id, decode_license_payload(decrypted_data, feature_table)
+    except Exception as e:
+        return None, LicenseResult(LicenseStatus.MALFORMED, detail=str(e))
+
+
+# 进程池工作进程内复用的 Fernet 实例
+_worker_fernets = {}
+
+# 默认配置文件：插件目录下的 license_config.json（ComfyUI 的工作目录是其根目录，不能用相对路径）
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "license_config.json")
+
+# 默认受保护的路由（配置中没有 route_protection 或配置无法读取时使用）
+DEFAULT_ROUTE_PROTECTION = {
+    "enabled": True,  # 由中间件检查下列接口的许可证
+    "protected": [  # 需要许可证的路径前缀和方法
+        {"path": "/prompt", "methods": ["POST"]},
+        {"path": "/queue", "methods": ["POST"]},
+        {"path": "/interrupt", "methods": ["POST"]},
+        {"path": "/upload", "methods": ["POST"]},
+        {"path": "/history", "methods": ["GET", "POST"]}
+    ],
+    "exempt": [  # 明确跳过检查的高频路由（优先级按最长前缀）
+        {"path": "/ws"},
+        {"path": "/view"}
+    ],
+    "api_prefixes": ["/api"],  # ComfyUI 在这些前缀下注册了同样的接口
+    "multipart_key_field": "license_key",  # 上传时携带卡密的第一个表单字段名
+    "multipart_key_max_bytes": 16384  # 查找该字段时最多读取的请求体字节数
+}
+
+# 许可证必须包含的字段
+REQUIRED_FIELDS = ('user_id', 'expire_time', 'max_uses', 'features')
+
+
+class LicenseCache:
+    """
+    已验证许可证的 LRU 缓存
+    条目在许可证 expire_time 与 TTL 中较早的时间点失效
+    """
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        """查询缓存，命中时返回许可证数据，否则返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            deadline, value = entry
+            if now >= deadline:
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return value
+
+    def put(self, digest, value, expire_time=-1):
+        """写入缓存，expire_time 为许可证过期时间戳（-1 表示永不过期）"""
+        if self.max_size <= 0:
+            return
+        deadline = time.time() + self.ttl
+        if expire_time != -1:
+            deadline = min(deadline, expire_time)
+        with self._lock:
+            self._entries[digest] = (deadline, value)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, digest):
+        """移除单个条目"""
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """返回缓存统计信息"""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class _ValidatorState:
+    """一份已验证的配置及对应的 Fernet 实例"""
+    __slots__ = ("config", "key_specs", "fernets", "fernet_by_id", "fernet", "prefix_tokens", "session_secret",
+                 "feature_index", "feature_table")
+
+    def __init__(self, config, key_specs):
+        self.config = config
+        self.key_specs = key_specs
+        self.fernets = [(key_id, Fernet(key.encode())) for key_id, key in key_specs]
+        self.fernet_by_id = dict(self.fernets)
+        # MultiFernet 用主密钥加密，可解密任一密钥加密的许可证
+        self.fernet = MultiFernet([fernet for _, fernet in self.fernets])
+        # 配置了 encryption_keys 时，新生成的许可证带上密钥ID前缀
+        self.prefix_tokens = bool(config.get("encryption_keys"))
+        # 会话令牌签名密钥，密钥轮换后旧会话自动失效
+        self.session_secret = derive_session_secret(config, key_specs[0][1])
+        # 功能 -> 节点类型的预编译索引
+        self.feature_index = FeatureIndex.from_config(config.get("feature_nodes"))
+        # 紧凑格式许可证的功能位序
+        self.feature_table = tuple(config.get("payload_features") or config.get("features", []))
+
+    def encrypt(self, data):
+        """用主密钥加密，返回许可证字符串"""
+        token = self.fernet.encrypt(data).decode()
+        if self.prefix_tokens:
+            return f"{self.key_specs[0][0]}.{token}"
+        return token
+
+
+class ConfigWatcher:
+    """
+    配置文件监视器
+    按间隔检查文件的 mtime/大小，变化时在后台线程中重新加载配置
+    """
+    def __init__(self, validator, interval=2.0):
+        self.validator = validator
+        self.interval = interval
+        self._signature = self._stat_signature()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.validator.config_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="license-config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self):
+        """检查一次配置文件，发生变化时重新加载"""
+        signature = self._stat_signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        return self.validator.reload_config()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
 
 class LicenseValidator:
     """
     许可证验证器 - 仅验证功能
     不包含任何许可证生成能力，确保服务器端安全
     """
-    def __init__(self, config_path="license_config.json"):
+    def __init__(self, config_path=DEFAULT_CONFIG_PATH):
         self.config_path = config_path
-        self.config = self.load_config()
         
+        # 配置与预先构建的 Fernet 实例作为一个整体保存，热重载时整体替换
+        self._state = self._build_state(self.load_config())
+        self._config_watcher = None
+        # 配置生效（创建全局验证器、热重载成功）后以新配置调用的回调
+        self.config_listeners = []
+        self.key_validations = {}
+        
+        # 已验证许可证缓存，以及最近验证失败的许可证（负缓存）
+        self.cache = LicenseCache()
+        self.negative_cache = LicenseCache()
+        self._configure_cache()
+        
+        # 多进程/多节点共享的状态（使用次数、吊销列表、缓存失效事件）
+        self.state_backend = create_state_backend(
+            self.config, base_dir=os.path.dirname(os.path.abspath(self.config_path))
+        )
+        self.node_id = uuid.uuid4().hex
+        self._state_sync_started = False
+        
+        # 吊销列表：共享状态后端中的条目 + 吊销文件
+        self.revocations = RevocationList(license_digest)
+        self.revocations.replace("stored", self.state_backend.load_revocations())
+        revocation_config = self.config.get("revocation", {})
+        if revocation_config.get("file"):
+            self.revocations.load_file(os.path.join(
+                os.path.dirname(os.path.abspath(self.config_path)), revocation_config["file"]
+            ))
+        
+        # 服务器端使用次数账本，写入后端后把最新总数广播给其他节点
+        self.usage_ledger = create_usage_ledger(self.config.get("usage_ledger"), self.state_backend)
+        if self.usage_ledger is not None:
+            self.usage_ledger.on_flush = self._publish_usage
+        
+        # 审计日志：记录验证、使用和受保护接口的访问，后台批量写入
+        self.audit_log = create_audit_log(
+            self.config.get("audit_log"), base_dir=os.path.dirname(os.path.abspath(self.config_path))
+        )
+        
+        # 异步验证使用的线程池/进程池（首次使用时创建）
+        executor_config = self.config.get("executor", {})
+        self.executor_type = executor_config.get("type", "thread")
+        self.executor_workers = executor_config.get("max_workers", 4)
+        self.inline_max_length = executor_config.get("inline_max_length", 0)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # 进行中的异步验证：卡密摘要 -> Task（并发验证同一卡密时合并）
+        self._inflight = {}
+        
+    @property
+    def config(self):
+        """当前生效的配置"""
+        return self._state.config
+    
+    @property
+    def feature_index(self):
+        """当前配置编译出的功能节点索引"""
+        return self._state.feature_index
+    
+    def _build_state(self, config):
+        """验证配置并预先构建 Fernet 实例，避免每次验证重复创建"""
         # 验证配置完整性
-        if not self.config.get("encryption_key"):
+        key_specs = parse_encryption_keys(config)
+        if not key_specs:
             raise ValueError("缺少加密密钥！请使用独立生成器生成配置文件。")
         
+        return _ValidatorState(config, key_specs)
+    
+    def _configure_cache(self):
+        """根据配置调整缓存参数"""
+        cache_config = self.config.get("cache", {})
+        self.cache.max_size = cache_config.get("max_size", 1024) if cache_config.get("enabled", True) else 0
+        self.cache.ttl = cache_config.get("ttl", 300)
+        
+        negative_config = self.config.get("negative_cache", {})
+        self.negative_cache.max_size = negative_config.get("max_size", 4096) if negative_config.get("enabled", True) else 0
+        self.negative_cache.ttl = negative_config.get("ttl", 30)
+        
+        self.session_ttl = self.config.get("session", {}).get("ttl", 900)
+    
+    def reload_config(self):
+        """
+        重新加载配置文件，新配置解析或验证失败时保留旧配置
+        返回是否成功切换到新配置
+        """
+        try:
+            state = self._build_state(self.load_config())
+        except Exception as e:
+            print(f"[License Validator] 配置重新加载失败，继续使用旧配置: {e}")
+            return False
+        
+        old_state, self._state = self._state, state
+        
+        # 加密密钥或紧凑格式的功能位序变化后，已解析的许可证缓存全部失效
+        if old_state.key_specs != state.key_specs or old_state.feature_table != state.feature_table:
+            self.cache.clear()
+            self.negative_cache.clear()
+        self._configure_cache()
+        self.notify_config_listeners()
+        
+        print("[License Validator] 配置已重新加载")
+        return True
+    
+    def notify_config_listeners(self):
+        """以当前配置调用全部配置回调（重新编译路由表等由配置派生的状态）"""
+        config = self.config
+        for callback in list(self.config_listeners):
+            try:
+                callback(config)
+            except Exception as e:
+                print(f"[License Validator] 应用新配置失败: {e}")
+    
+    def start_state_sync(self):
+        """订阅其他节点广播的状态事件"""
+        if self._state_sync_started:
+            return
+        self._state_sync_started = True
+        self.state_backend.subscribe(self._on_state_event)
+    
+    def publish_event(self, event_type, **payload):
+        """向其他节点广播状态事件"""
+        payload["type"] = event_type
+        payload["origin"] = self.node_id
+        try:
+            self.state_backend.publish(json.dumps(payload))
+        except Exception as e:
+            print(f"[License Validator] 状态事件广播失败: {e}")
+    
+    def _publish_usage(self, totals):
+        self.publish_event("usage", totals=totals)
+    
+    def _on_state_event(self, message):
+        """处理其他节点广播的事件，只修改本地内存"""
+        try:
+            event = json.loads(message)
+        except ValueError:
+            return
+        if event.get("origin") == self.node_id:
+            return
+        
+        event_type = event.get("type")
+        if event_type == "usage":
+            if self.usage_ledger is not None:
+                self.usage_ledger.apply_totals(event["totals"])
+        elif event_type == "invalidate":
+            self._invalidate_digests(bytes.fromhex(digest) for digest in event["digests"])
+        elif event_type == "revoke":
+            self.revocations.update("stored", add=event.get("add", ()), remove=event.get("remove", ()))
+    
+    def revoke(self, entries):
+        """
+        吊销许可证：entries 为卡密、digest:<摘要> 或 user:<用户ID>
+        写入共享状态后端并通知其他节点，返回规范化后的条目
+        """
+        entries = [entry for entry in map(self.revocations.normalize, entries) if entry]
+        if entries:
+            self.state_backend.add_revocations(entries)
+            self.revocations.update("stored", add=entries)
+            self.publish_event("revoke", add=entries)
+        return entries
+    
+    def unrevoke(self, entries):
+        """撤销吊销（吊销文件中的条目需从文件中删除）"""
+        entries = [entry for entry in map(self.revocations.normalize, entries) if entry]
+        if entries:
+            self.state_backend.remove_revocations(entries)
+            self.revocations.update("stored", remove=entries)
+            self.publish_event("revoke", remove=entries)
+        return entries
+    
+    def start_revocation_watcher(self):
+        """按配置启动吊销文件监视线程"""
+        self.revocations.start_watcher(self.config.get("revocation", {}).get("reload_interval", 2.0))
+    
+    def invalidate_license(self, license_key):
+        """使许可证在所有节点的缓存中失效（已签发的会话令牌需吊销许可证才能失效）"""
+        digest = license_digest(license_key)
+        self._invalidate_digests([digest])
+        self.publish_event("invalidate", digests=[digest.hex()])
+    
+    def _invalidate_digests(self, digests):
+        for digest in digests:
+            self.cache.invalidate(digest)
+            self.negative_cache.invalidate(digest)
+    
+    def start_config_watcher(self):
+        """按配置启动配置文件监视线程"""
+        reload_config = self.config.get("config_reload", {})
+        if not reload_config.get("enabled", True) or self._config_watcher is not None:
+            return
+        self._config_watcher = ConfigWatcher(self, interval=reload_config.get("interval", 2.0))
+        self._config_watcher.start()
+    
     def load_config(self):
         """加载许可证配置"""
         default_config = {
@@ -46,7 +593,90 @@ class LicenseValidator:
                 "💫 高级功能"
             ],
             "encryption_key": None,  # 必须由独立生成器提供
+            "encryption_keys": [],  # 多密钥轮换：[{"id": "k2", "key": "..."}, ...]，第一个为主密钥
             "salt": "comfyui_license_salt",
+            "license_key_header": "X-License-Key",  # 携带卡密的请求头
+            "license_key_query_param": "license_key",  # 携带卡密的查询参数，为空则禁用
+            "admin_token": None,  # 管理接口（吊销、审计日志查询）的令牌（请求头 X-Admin-Token），为空时关闭这些接口
+            "config_reload": {
+                "enabled": True,  # 配置文件变化时自动重新加载，无需重启 ComfyUI
+                "interval": 2.0  # 检查间隔（秒）
+            },
+            "cache": {
+                "enabled": True,
+                "max_size": 1024,  # 最多缓存的许可证数量
+                "ttl": 300  # 缓存有效期（秒）
+            },
+            "negative_cache": {
+                "enabled": True,
+                "max_size": 4096,  # 最多记录的失败许可证数量
+                "ttl": 30  # 失败结果缓存时间（秒）
+            },
+            "rate_limit": {
+                "enabled": True,
+                "rate": 1.0,  # 每个地址每秒恢复的失败次数额度
+                "burst": 10,  # 连续失败次数上限，超过后返回 429
+                "endpoints": {},  # 按端点覆盖，如 {"/prompt": {"rate": 2, "burst": 20}}
+                "max_entries": 65536  # 最多跟踪的 (地址, 端点) 数量
+            },
+            "route_protection": copy.deepcopy(DEFAULT_ROUTE_PROTECTION),
+            "payload_features": None,  # 紧凑格式卡密的功能位序（只能在末尾追加），为空时使用 features
+            "feature_nodes": {},  # 功能 -> 节点类型列表，如 {"🎥 视频处理": ["VHS_LoadVideo"]}；许可证不含该功能时拒绝使用这些节点
+            "prompt_quota": {
+                "enabled": True,
+                "max_in_flight": 4,  # 每个许可证同时排队/执行的任务数上限，0表示不限制
+                "per_minute": 60,  # 每个许可证每分钟最多提交的任务数，0表示不限制
+                "busy_retry_after": 5,  # 同时执行的任务过多时建议的重试间隔（秒）
+                "slot_timeout": 3600,  # 超过此时间仍未收到结束事件的任务视为丢失，释放名额
+                "max_entries": 65536  # 最多跟踪的许可证数量
+            },
+            "revocation": {
+                "file": "revoked_licenses.txt",  # 吊销文件（相对于配置文件所在目录），不存在时忽略
+                "reload_interval": 2.0  # 检查吊销文件的间隔（秒），小于0表示不检查
+            },
+            "session": {
+                "enabled": True,  # 允许用许可证换取短期会话令牌（POST /license/session）
+                "ttl": 900,  # 会话有效期（秒），不超过许可证本身的过期时间
+                "secret": None  # 签名密钥，为空时由主加密密钥派生
+            },
+            "executor": {
+                "type": "thread",  # thread 或 process
+                "max_workers": 4,
+                "inline_max_length": 0  # 不超过此长度的密钥直接在事件循环中验证
+            },
+            "batch": {
+                "max_keys": 100000,  # 单次批量验证的最大卡密数量
+                "stream_threshold": 1000,  # 超过此数量时以 NDJSON 流式返回
+                "chunk_size": 256  # 流式返回时每批并行验证的数量
+            },
+            "state_backend": {
+                "type": None,  # sqlite、memory 或 redis，为空时沿用 usage_ledger.backend（默认 sqlite）
+                "path": None,  # sqlite 文件路径（相对于配置文件所在目录），为空时沿用 usage_ledger.path
+                "poll_interval": 1.0,  # sqlite 后端读取其他进程事件的间隔（秒）
+                "redis_url": "redis://127.0.0.1:6379/0",
+                "key_prefix": "comfyui_license"  # redis 键名前缀，多套部署共用一个 redis 时区分
+            },
+            "usage_ledger": {
+                "enabled": True,  # 关闭后沿用每次使用重新加密许可证的旧方案
+                "flush_interval": 1.0  # 批量写入间隔（秒）
+            },
+            "audit_log": {
+                "enabled": True,
+                "directory": "audit_logs",  # 日志目录（相对于配置文件所在目录）
+                "buffer_size": 10000,  # 内存缓冲区最多保存的事件数量
+                "overflow": "drop_oldest",  # 缓冲区满时：drop_oldest、drop_newest 或 block（阻塞最多 block_timeout 秒，事件循环中的调用按 drop_newest 处理）
+                "block_timeout": 0.05,
+                "flush_interval": 1.0,  # 批量写入间隔（秒）
+                "max_file_bytes": 16777216,  # 单个日志文件超过此大小时轮转
+                "max_files": 20  # 最多保留的日志文件数量
+            },
+            "static_assets": {
+                "mode": "memory",  # memory: 内存缓存 + ETag；disk: 每次读取磁盘且禁止缓存
+                "max_age": 0,  # 大于0时允许浏览器缓存的秒数，否则每次用 ETag 协商
+                "reload_interval": 2.0,  # 检查文件 mtime 的间隔（秒），小于0表示不检查
+                "index_reload_interval": 2.0,  # 检查 ComfyUI index.html 的间隔（秒），0表示每次请求都检查
+                "compress_min_size": 512  # 小于此大小的文件不压缩
+            },
             "generator_info": "此配置应由独立生成器创建"
         }
         
@@ -75,78 +705,430 @@ class LicenseValidator:
         }
     
     def validate_license(self, license_key):
-        """验证许可证"""
+        """验证许可证，返回 LicenseResult"""
+        result = self._validate_token(license_key)
+        if not result.ok:
+            return result
+        return self._apply_usage(result.data, result.license_id)
+    
+    async def avalidate_license(self, license_key):
+        """异步验证许可证，解密在线程/进程池中执行，不阻塞事件循环"""
+        result = await self._avalidate_token(license_key)
+        if not result.ok:
+            return result
+        await self._aprefetch_usage([result.license_id])
+        return self._apply_usage(result.data, result.license_id)
+    
+    def validate_many(self, license_keys):
+        """批量验证许可证，在线程/进程池中并行解密，结果顺序与输入一致"""
+        license_keys = list(license_keys)
+        executor = self._get_executor()
+        if self.executor_type == "process":
+            results = [None] * len(license_keys)
+            pending = []
+            for index, license_key in enumerate(license_keys):
+                if not license_key:
+                    results[index] = self._reject(RESULT_EMPTY)
+                    continue
+                digest = license_digest(license_key)
+                if digest in self.revocations.digests:
+                    results[index] = self._reject(RESULT_REVOKED)
+                    continue
+                cached = self.cache.get(digest)
+                if cached is not None:
+                    results[index] = self._apply_usage(dict(cached), license_id_of(cached, digest))
+                    continue
+                rejected = self.negative_cache.get(digest)
+                if rejected is not None:
+                    results[index] = self._reject(rejected)
+                    continue
+                pending.append(index)
+            
+            # 进程池只负责解密，结果检查在主进程完成
+            state = self._state
+            decrypted = executor.map(
+                decrypt_license_token,
+                [state.key_specs] * len(pending),
+                [license_keys[index] for index in pending],
+                [state.feature_table] * len(pending),
+                chunksize=max(1, len(pending) // (self.executor_workers * 4))
+            )
+            for index, decrypted_result in zip(pending, decrypted):
+                results[index] = self.validate_decrypted(license_keys[index], decrypted_result)
+            return results
+        
+        return list(executor.map(self.validate_license, license_keys))
+    
+    def validate_decrypted(self, license_key, decrypted):
+        """
+        用 decrypt_license_token 在其他进程中得到的 (密钥ID, 许可证数据) 完成验证，
+        结果与 validate_license 相同（批量验证和命令行工具在进程池中解密后调用）
+        """
         if not license_key:
-            return False, "许可证密钥不能为空"
+            return self._reject(RESULT_EMPTY)
+        if license_key.startswith(SESSION_PREFIX):
+            return self.validate_license(license_key)
+        digest = license_digest(license_key)
+        if digest in self.revocations.digests:
+            return self._reject(RESULT_REVOKED)
+        
+        key_id, payload = decrypted
+        if key_id is None:
+            return self._remember_failure(digest, self._reject(payload))
+        self._count_key(key_id)
+        result = self._remember_failure(digest, self._check_license(digest, payload))
+        return self._apply_usage(result.data, result.license_id) if result.ok else result
+    
+    async def avalidate_many(self, license_keys):
+        """
+        validate_many 的异步版本，结果顺序与输入一致
+        先并发解密全部卡密，再在线程中按批读取账本中的使用次数，避免逐个查询后端阻塞事件循环
+        """
+        results = await asyncio.gather(*(self._avalidate_token(license_key) for license_key in license_keys))
+        await self._aprefetch_usage([result.license_id for result in results if result.ok])
+        return [self._apply_usage(result.data, result.license_id) if result.ok else result for result in results]
+    
+    def _reject(self, result):
+        """记录失败指标并返回失败结果"""
+        metrics.validations.inc(METRIC_OUTCOMES[result.status])
+        return result
+    
+    def _validate_token(self, license_key):
+        """验证许可证本身（缓存 + 解密），不包含账本中的使用次数"""
+        if not license_key:
+            return self._reject(RESULT_EMPTY)
+        if license_key.startswith(SESSION_PREFIX):
+            return self._validate_session(license_key)
+        
+        # 已吊销的卡密在解密之前拒绝；命中缓存时无需再次解密
+        digest = license_digest(license_key)
+        if digest in self.revocations.digests:
+            return self._reject(RESULT_REVOKED)
+        cached = self.cache.get(digest)
+        if cached is not None:
+            return LicenseResult(LicenseStatus.VALID, dict(cached), license_id=license_id_of(cached, digest))
+        
+        rejected = self.negative_cache.get(digest)
+        if rejected is not None:
+            return self._reject(rejected)
+        
+        return self._remember_failure(digest, self._validate_uncached(digest, license_key))
+    
+    async def _avalidate_token(self, license_key):
+        """_validate_token 的异步版本"""
+        if not license_key:
+            return self._reject(RESULT_EMPTY)
+        # 会话令牌只需一次 HMAC 校验，直接在事件循环中完成
+        if license_key.startswith(SESSION_PREFIX):
+            return self._validate_session(license_key)
+        
+        digest = license_digest(license_key)
+        if digest in self.revocations.digests:
+            return self._reject(RESULT_REVOKED)
+        cached = self.cache.get(digest)
+        if cached is not None:
+            return LicenseResult(LicenseStatus.VALID, dict(cached), license_id=license_id_of(cached, digest))
+        
+        # 最近验证失败过的许可证直接拒绝，不再解密
+        rejected = self.negative_cache.get(digest)
+        if rejected is not None:
+            return self._reject(rejected)
+        
+        # 短密钥直接在当前线程验证，省去线程切换开销
+        if len(license_key) <= self.inline_max_length:
+            return self._remember_failure(digest, self._validate_uncached(digest, license_key))
+        
+        # 同一卡密已有进行中的解密时等待其结果，不再重复解密
+        task = self._inflight.get(digest)
+        if task is None:
+            # 解密作为独立任务运行，任一调用方（包括发起者）被取消都不会影响其他等待者
+            task = asyncio.ensure_future(self._avalidate_uncached(digest, license_key))
+            self._inflight[digest] = task
+            task.add_done_callback(lambda _: self._inflight.pop(digest, None))
+            coalesced = False
+        else:
+            metrics.coalesced.inc()
+            coalesced = True
+        result = await asyncio.shield(task)
+        if not result.ok:
+            # 失败指标已由执行解密的任务记录一次
+            return self._reject(result) if coalesced else result
+        # 调用方会修改许可证数据，每个调用方各自复制任务的结果
+        return LicenseResult(LicenseStatus.VALID, dict(result.data), license_id=result.license_id)
+    
+    async def _avalidate_uncached(self, digest, license_key):
+        """在线程池/进程池中解密并检查许可证"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        if self.executor_type == "process":
+            # 进程池只负责解密，结果检查和缓存在主进程完成
+            state = self._state
+            key_id, payload = await loop.run_in_executor(
+                executor, decrypt_license_token, state.key_specs, license_key, state.feature_table
+            )
+            if key_id is None:
+                return self._remember_failure(digest, self._reject(payload))
+            self._count_key(key_id)
+            return self._remember_failure(digest, self._check_license(digest, payload))
+        
+        result = await loop.run_in_executor(executor, self._validate_uncached, digest, license_key)
+        return self._remember_failure(digest, result)
+    
+    def _validate_session(self, token):
+        """校验会话令牌，返回令牌中签名保存的许可证数据（无需查询本进程的任何状态）"""
+        state = self._state
+        verified = verify_session(state.session_secret, token, state.feature_table)
+        if verified is None:
+            return self._reject(RESULT_SESSION_INVALID)
+        digest, expires_at, license_data = verified
+        if digest in self.revocations.digests:
+            return self._reject(RESULT_REVOKED)
+        if time.time() >= expires_at:
+            return self._reject(RESULT_SESSION_EXPIRED)
+        return LicenseResult(LicenseStatus.VALID, license_data, license_id=license_id_of(license_data, digest))
+    
+    async def acreate_session(self, license_key):
+        """
+        验证许可证并签发会话令牌，返回 LicenseResult
+        data 为 {'session_token', 'expires_at', 'license_info'}，会话过期时间不超过许可证的 expire_time
+        只接受许可证本身，不能用会话令牌续期（否则会话可以无限延长）
+        """
+        if license_key and license_key.startswith(SESSION_PREFIX):
+            return self._reject(LicenseResult(LicenseStatus.MALFORMED, detail="会话令牌不能用于创建会话，请使用许可证密钥"))
+        result = await self._avalidate_token(license_key)
+        if not result.ok:
+            return result
+        license_data = result.data
+        await self._aprefetch_usage([result.license_id])
+        checked = self._apply_usage(dict(license_data), result.license_id)
+        if not checked.ok:
+            return checked
+        
+        expires_at = int(time.time()) + self.session_ttl
+        if license_data['expire_time'] != -1:
+            expires_at = min(expires_at, int(license_data['expire_time']))
         
+        state = self._state
+        try:
+            # 令牌中保存的是卡密本身的使用次数，账本中的次数在每次校验时合并
+            session_token = sign_session(
+                state.session_secret, license_digest(license_key), expires_at, license_data, state.feature_table
+            )
+        except ValueError as e:
+            return self._reject(LicenseResult(LicenseStatus.MALFORMED, detail=str(e)))
+        return LicenseResult(LicenseStatus.VALID, {
+            'session_token': session_token,
+            'expires_at': expires_at,
+            'license_info': checked.data
+        }, license_id=checked.license_id)
+    
+    def _remember_failure(self, digest, result):
+        """验证失败的结果写入负缓存"""
+        if not result.ok:
+            self.negative_cache.put(digest, result)
+        return result
+    
+    def _validate_uncached(self, digest, license_key):
+        """解密并检查许可证（不查询缓存）"""
+        start = time.perf_counter()
         try:
             # 解密许可证
-            fernet = Fernet(self.config["encryption_key"].encode())
-            decrypted_data = fernet.decrypt(license_key.encode())
-            license_data = json.loads(decrypted_data.decode())
-            
+            state = self._state
+            key_id, decrypted_data = decrypt_with_keys(state.fernet_by_id, state.fernets, license_key)
+        except UnknownKeyId as e:
+            return self._reject(LicenseResult(LicenseStatus.UNKNOWN_KEY_ID, detail=str(e)))
+        except Exception as e:
+            return self._reject(LicenseResult(LicenseStatus.DECRYPT_FAILED, detail=str(e)))
+        decrypted = time.perf_counter()
+        metrics.decrypt_seconds.observe(decrypted - start)
+        self._count_key(key_id)
+        
+        try:
+            # 紧凑格式只需一次 struct 解包，旧格式解析 JSON
+            license_data = decode_license_payload(decrypted_data, state.feature_table)
+        except Exception as e:
+            return self._reject(LicenseResult(LicenseStatus.MALFORMED, detail=str(e)))
+        metrics.parse_seconds.observe(time.perf_counter() - decrypted)
+        
+        return self._check_license(digest, license_data)
+    
+    def _check_license(self, digest, license_data):
+        """检查已解密的许可证内容，通过后写入缓存"""
+        try:
             # 验证许可证结构
-            required_fields = ['user_id', 'expire_time', 'max_uses', 'features']
-            for field in required_fields:
+            for field in REQUIRED_FIELDS:
                 if field not in license_data:
-                    return False, f"许可证格式错误：缺少{field}字段"
+                    return self._reject(LicenseResult(LicenseStatus.MISSING_FIELD, detail=field))
             
             # 检查过期时间
-            if license_data['expire_time'] != -1:  # -1表示永不过期
-                expire_time = datetime.fromtimestamp(license_data['expire_time'])
-                if datetime.now() > expire_time:
-                    return False, "许可证已过期"
+            expire_time = license_data['expire_time']
+            if expire_time != -1 and time.time() > expire_time:  # -1表示永不过期
+                return self._reject(RESULT_EXPIRED)
             
             # 检查使用次数
             current_uses = license_data.get('current_uses', 0)
             if license_data['max_uses'] != -1 and current_uses >= license_data['max_uses']:
-                return False, "许可证使用次数已耗尽"
+                return self._reject(RESULT_EXHAUSTED)
             
-            return True, license_data
+            self.cache.put(digest, license_data, expire_time)
+            return LicenseResult(LicenseStatus.VALID, dict(license_data), license_id=license_id_of(license_data, digest))
             
         except Exception as e:
-            return False, f"许可证验证失败: {str(e)}"
+            return self._reject(LicenseResult(LicenseStatus.MALFORMED, detail=str(e)))
+    
+    def _count_key(self, key_id):
+        """记录每个密钥的验证次数（无锁，允许极少量计数误差）"""
+        counts = self.key_validations
+        counts[key_id] = counts.get(key_id, 0) + 1
+    
+    def get_key_stats(self):
+        """每个密钥的验证次数，用于判断旧密钥是否可以下线"""
+        return {key_id: self.key_validations.get(key_id, 0) for key_id, _ in self._state.key_specs}
+    
+    def rotate_license(self, license_key):
+        """用当前主密钥重新加密许可证（内容不变）"""
+        state = self._state
+        _, decrypted_data = decrypt_with_keys(state.fernet_by_id, state.fernets, license_key)
+        return state.encrypt(decrypted_data)
+    
+    async def _aprefetch_usage(self, license_ids):
+        """
+        在线程中读取账本尚未加载的使用次数，避免首次出现的许可证在事件循环中同步查询后端
+        （Redis 需要一次网络往返，SQLite 需要等待写入线程持有的锁）
+        """
+        if self.usage_ledger is None:
+            return
+        missing = self.usage_ledger.missing(license_ids)
+        if missing:
+            await asyncio.get_running_loop().run_in_executor(None, self.usage_ledger.prefetch, missing)
+    
+    def _apply_usage(self, license_data, license_id):
+        """检查用户是否被吊销，合并账本中记录的使用次数并检查是否耗尽"""
+        if self.revocations.is_revoked(license_data):
+            return self._reject(RESULT_REVOKED)
+        if self.usage_ledger is not None:
+            current_uses = license_data.get('current_uses', 0) + self.usage_ledger.get_uses(license_id)
+            if license_data['max_uses'] != -1 and current_uses >= license_data['max_uses']:
+                return self._reject(RESULT_EXHAUSTED)
+            license_data['current_uses'] = current_uses
+        
+        metrics.validations.inc("valid")
+        return LicenseResult(LicenseStatus.VALID, license_data, license_id=license_id)
+    
+    def _get_executor(self):
+        """按配置延迟创建验证线程池/进程池"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    if self.executor_type == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.executor_workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.executor_workers,
+                            thread_name_prefix="license-validator"
+                        )
+        return self._executor
+    
+    def shutdown(self):
+        """关闭验证线程池/进程池和配置、吊销文件监视线程，并写入剩余的审计事件"""
+        if self._config_watcher is not None:
+            self._config_watcher.stop()
+            self._config_watcher = None
+        self.revocations.stop()
+        if self.audit_log is not None:
+            self.audit_log.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+    
+    def audit(self, event_type, license_key, result, **fields):
+        """记录审计事件（未启用审计日志时忽略），只记录卡密摘要，不记录卡密本身"""
+        audit_log = self.audit_log
+        if audit_log is None:
+            return
+        if license_key:
+            if license_key.startswith(SESSION_PREFIX):
+                # 会话令牌记录签发它的许可证摘要
+                verified = verify_session(self._state.session_secret, license_key)
+                fields["license"] = verified[0].hex() if verified else None
+                fields["session"] = True
+            else:
+                fields["license"] = license_digest(license_key).hex()
+        fields["code"] = result.code
+        if result.ok:
+            license_data = result.data.get('license_data', result.data)
+            fields["user_id"] = license_data.get('user_id')
+        audit_log.record(event_type, **fields)
     
     def use_license(self, license_key):
-        """使用许可证（扣除使用次数）"""
-        is_valid, result = self.validate_license(license_key)
-        if not is_valid:
-            return False, result
+        """使用许可证（扣除使用次数），返回 LicenseResult"""
+        result = self._use_license(license_key)
+        self.audit("use", license_key, result)
+        return result
+    
+    def _use_license(self, license_key):
+        result = self._validate_token(license_key)
+        if not result.ok:
+            return result
         
-        license_data = result
+        license_data = result.data
+        if self.revocations.is_revoked(license_data):
+            return self._reject(RESULT_REVOKED)
         
-        # 增加使用次数
-        license_data['current_uses'] = license_data.get('current_uses', 0) + 1
+        if self.usage_ledger is not None:
+            # 在服务器端账本中计数，许可证密钥保持不变
+            success, current_uses = self.usage_ledger.increment_and_check(
+                result.license_id,
+                license_data['max_uses'],
+                base_uses=license_data.get('current_uses', 0)
+            )
+            if not success:
+                return RESULT_EXHAUSTED
+            license_data['current_uses'] = current_uses
+            new_license_key = license_key
+        else:
+            # 未启用账本时沿用旧方案：增加使用次数并按原格式重新加密许可证
+            license_data['current_uses'] = license_data.get('current_uses', 0) + 1
+            try:
+                state = self._state
+                _, decrypted_data = decrypt_with_keys(state.fernet_by_id, state.fernets, license_key)
+                if is_compact_payload(decrypted_data):
+                    payload = encode_license_payload(license_data, state.feature_table)
+                else:
+                    payload = json.dumps(license_data).encode()
+                new_license_key = state.encrypt(payload)
+            except Exception as e:
+                return LicenseResult(LicenseStatus.UPDATE_FAILED, detail=str(e))
         
-        # 重新加密许可证
-        try:
-            fernet = Fernet(self.config["encryption_key"].encode())
-            encrypted_data = fernet.encrypt(json.dumps(license_data).encode())
-            new_license_key = encrypted_data.decode()
-            
-            # 计算剩余使用次数
-            remaining_uses = license_data['max_uses'] - license_data['current_uses']
-            if license_data['max_uses'] == -1:
-                remaining_uses = -1  # 无限使用
-            
-            return True, {
-                'new_license_key': new_license_key,
-                'remaining_uses': remaining_uses,
-                'license_data': license_data
-            }
-            
-        except Exception as e:
-            return False, f"许可证更新失败: {str(e)}"
+        # 计算剩余使用次数
+        remaining_uses = license_data['max_uses'] - license_data['current_uses']
+        if license_data['max_uses'] == -1:
+            remaining_uses = -1  # 无限使用
+        
+        return LicenseResult(LicenseStatus.VALID, {
+            'new_license_key': new_license_key,
+            'remaining_uses': remaining_uses,
+            'license_data': license_data
+        }, license_id=result.license_id)
     
     def get_license_info(self, license_key):
-        """获取许可证信息"""
-        is_valid, result = self.validate_license(license_key)
-        if not is_valid:
-            return False, result
+        """获取许可证信息，返回 LicenseResult"""
+        result = self.validate_license(license_key)
+        if not result.ok:
+            return result
         
-        license_data = result
+        return LicenseResult(LicenseStatus.VALID, self._format_license_info(result.data), license_id=result.license_id)
+    
+    async def aget_license_info(self, license_key):
+        """异步获取许可证信息"""
+        result = await self.avalidate_license(license_key)
+        if not result.ok:
+            return result
         
-        # 格式化信息
+        return LicenseResult(LicenseStatus.VALID, self._format_license_info(result.data), license_id=result.license_id)
+    
+    def _format_license_info(self, license_data):
+        """格式化许可证信息"""
         info = {
             'user_id': license_data['user_id'],
             'features': license_data['features'],
@@ -165,7 +1147,52 @@ class LicenseValidator:
         else:
             info['expire_time_str'] = '永不过期'
         
-        return True, info
+        return info
+
+# 全局许可证验证器实例（首次使用时创建，避免导入时读取配置）
+_license_validator = None
+_license_validator_error = None
+_license_validator_lock = threading.Lock()
+_config_listeners = []
+
+def get_license_validator():
+    """
+    获取全局许可证验证器
+    创建失败（配置缺失或无效）时记住该错误，之后的调用直接抛出，不再每次重新读取配置；修复配置后需重启
+    """
+    global _license_validator, _license_validator_error
+    if _license_validator is None:
+        with _license_validator_lock:
+            if _license_validator is None:
+                if _license_validator_error is not None:
+                    raise _license_validator_error
+                try:
+                    with startup_timer.phase("加载许可证配置"):
+                        validator = LicenseValidator()
+                except Exception as e:
+                    print(f"[License Validator] 许可证验证器初始化失败: {e}")
+                    _license_validator_error = e
+                    raise
+                validator.config_listeners = _config_listeners
+                validator.notify_config_listeners()
+                validator.start_config_watcher()
+                validator.start_state_sync()
+                validator.start_revocation_watcher()
+                _license_validator = validator
+    return _license_validator
+
+def add_config_listener(callback):
+    """
+    注册配置回调：全局验证器创建后以及每次热重载成功后以新配置调用
+    验证器已创建时立即以当前配置调用一次；注册本身不会创建验证器
+    """
+    _config_listeners.append(callback)
+    validator = _license_validator
+    if validator is not None:
+        callback(validator.config)
 
-# 全局许可证验证器实例
-license_validator = LicenseValidator() 
\ No newline at end of file
+def __getattr__(name):
+    # 兼容 `from license_manager import license_validator` 的旧用法
+    if name == "license_validator":
+        return get_license_validator()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
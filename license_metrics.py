@@ -0,0 +1,140 @@
+"""
+ComfyUI License Manager 运行指标
+以 Prometheus 文本格式导出许可证验证热路径的计数和耗时
+
+计数器和直方图都是无锁的普通整数/浮点累加：在 GIL 下极少数并发更新可能丢失，
+换来热路径上没有锁竞争，也不会为每次请求分配对象（标签值直接作为字典键）
+"""
+
+from bisect import bisect_left
+
+# 耗时直方图的桶上限（秒）
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+
+class Counter:
+    """单标签计数器"""
+    def __init__(self, name, help_text, label_name=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.values = {}
+
+    def inc(self, label=None, amount=1):
+        values = self.values
+        values[label] = values.get(label, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label, value in sorted(self.values.items(), key=lambda item: str(item[0])):
+            if self.label_name is None or label is None:
+                lines.append(f"{self.name} {value}")
+            else:
+                lines.append(f'{self.name}{{{self.label_name}="{label}"}} {value}')
+        return lines
+
+
+class Histogram:
+    """固定桶直方图"""
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative + self.counts[-1]}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+def render_gauge(name, help_text, value):
+    """渲染一个采集时计算的 gauge"""
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+
+
+class LicenseMetrics:
+    """许可证系统的全部指标"""
+    def __init__(self):
+        self.validations = Counter(
+            "license_validations_total", "许可证验证次数（按结果）", "outcome"
+        )
+        self.decrypt_seconds = Histogram(
+            "license_decrypt_seconds", "许可证解密耗时"
+        )
+        self.parse_seconds = Histogram(
+            "license_parse_seconds", "许可证 JSON 解析耗时"
+        )
+        self.middleware_seconds = Histogram(
+            "license_middleware_check_seconds", "许可证中间件检查受保护请求的耗时"
+        )
+        self.prompt_seconds = Histogram(
+            "license_prompt_wrapper_seconds", "/prompt 请求经过许可证中间件的端到端耗时（含 ComfyUI 处理器）"
+        )
+        self.coalesced = Counter(
+            "license_coalesced_validations_total", "与进行中的解密合并、未重复解密的并发验证次数"
+        )
+        self.quota_rejections = Counter(
+            "license_prompt_quota_rejections_total", "超出任务配额被拒绝的 /prompt 请求数", "reason"
+        )
+        self.static_bytes = Counter(
+            "license_static_bytes_served_total", "静态资源发送的字节数", "asset"
+        )
+
+    def render(self, validator=None):
+        """生成 Prometheus 文本格式"""
+        lines = []
+        for metric in (self.validations, self.decrypt_seconds, self.parse_seconds,
+                       self.middleware_seconds, self.prompt_seconds, self.coalesced, self.quota_rejections, self.static_bytes):
+            lines.extend(metric.render())
+
+        if validator is not None:
+            cache_stats = validator.cache.stats()
+            for key in ("hits", "misses", "evictions"):
+                name = f"license_cache_{key}_total"
+                lines.extend([f"# HELP {name} 许可证缓存 {key}", f"# TYPE {name} counter",
+                              f"{name} {cache_stats[key]}"])
+            lines.extend(render_gauge("license_cache_size", "许可证缓存条目数", cache_stats["size"]))
+
+            negative_stats = validator.negative_cache.stats()
+            name = "license_negative_cache_hits_total"
+            lines.extend([f"# HELP {name} 负缓存命中次数（跳过解密的失败许可证）", f"# TYPE {name} counter",
+                          f"{name} {negative_stats['hits']}"])
+            lines.extend(render_gauge("license_negative_cache_size", "负缓存条目数", negative_stats["size"]))
+
+            lines.extend(render_gauge("license_revocations", "吊销列表条目数", len(validator.revocations)))
+
+            if validator.audit_log is not None:
+                audit_stats = validator.audit_log.stats()
+                name = "license_audit_dropped_total"
+                lines.extend([f"# HELP {name} 缓冲区满或写入失败而丢弃的审计事件数", f"# TYPE {name} counter",
+                              f"{name} {audit_stats['dropped']}"])
+                lines.extend(render_gauge("license_audit_buffered", "等待写入的审计事件数", audit_stats["buffered"]))
+            
+            key_stats = validator.get_key_stats()
+            name = "license_key_validations_total"
+            lines.extend([f"# HELP {name} 各加密密钥的解密次数", f"# TYPE {name} counter"])
+            for key_id, count in key_stats.items():
+                lines.append(f'{name}{{key_id="{key_id}"}} {count}')
+
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标实例
+metrics = LicenseMetrics()
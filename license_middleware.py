@@ -0,0 +1,519 @@
+"""
+ComfyUI License Manager 许可证中间件
+用一个 aiohttp 中间件统一保护 ComfyUI 的接口，取代逐个替换路由处理器的方式
+
+路由表在配置加载时编译为按路径段划分的前缀树，每个节点记录各 HTTP 方法的动作：
+    protect - 需要许可证
+    exempt  - 明确跳过检查（如 websocket、缩略图等高频路由）
+匹配时沿请求路径逐段向下查找，最长前缀的规则生效，耗时只与路径长度有关
+
+卡密依次从请求头/查询参数、multipart 请求体的第一个字段、旧版 JSON 请求体中读取；
+上传文件时只读取请求体开头的一小段，随后放回请求体流，文件内容原样流式交给原始处理器
+
+/prompt 还会检查工作流中的节点是否在许可证的功能范围内（见 feature_gate.py），
+以及按许可证的任务配额（见 prompt_quota.py），名额在任务结束事件到达时释放
+"""
+
+import copy
+import json
+import math
+import re
+import time
+from aiohttp import web
+from aiohttp.helpers import parse_mimetype
+from aiohttp.streams import AsyncStreamIterator, ChunkTupleAsyncStreamIterator
+
+try:
+    from .license_manager import (
+        get_license_validator, add_config_listener, DEFAULT_CONFIG_PATH, DEFAULT_ROUTE_PROTECTION
+    )
+    from .prompt_quota import PromptQuota
+    from .license_metrics import metrics
+    from .web import get_request_license_key, check_rate_limit, record_license_failure
+    from . import fast_json
+except ImportError:
+    from license_manager import (
+        get_license_validator, add_config_listener, DEFAULT_CONFIG_PATH, DEFAULT_ROUTE_PROTECTION
+    )
+    from prompt_quota import PromptQuota
+    from license_metrics import metrics
+    from web import get_request_license_key, check_rate_limit, record_license_failure
+    import fast_json
+
+PROTECT = "protect"
+EXEMPT = "exempt"
+
+# 旧版 JSON 请求体解析后保存在请求中的键，检查工作流节点时不再重复解析
+LEGACY_BODY_KEY = "license_manager.body"
+
+
+class _RouteNode:
+    __slots__ = ("children", "actions")
+
+    def __init__(self):
+        self.children = {}
+        # HTTP 方法（"*" 表示任意方法）-> (动作, 规则名称)
+        self.actions = None
+
+
+class RouteTable:
+    """路径前缀树 + 方法表"""
+    def __init__(self):
+        self._root = _RouteNode()
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 license_config.json 的 route_protection 配置编译路由表"""
+        config = config or {}
+        table = cls()
+        if not config.get("enabled", True):
+            return table
+        prefixes = [""] + [prefix.rstrip("/") for prefix in config.get("api_prefixes", []) if prefix]
+        for action, rules in ((PROTECT, config.get("protected", [])), (EXEMPT, config.get("exempt", []))):
+            for rule in rules:
+                # ComfyUI 同时在 /api 前缀下注册了同样的接口
+                for prefix in prefixes:
+                    table.add(prefix + rule["path"], action, rule.get("methods"), endpoint=rule["path"])
+        return table
+
+    def add(self, path, action, methods=None, endpoint=None):
+        """
+        添加规则，path 为路径前缀，methods 为空表示所有方法
+        endpoint 为规则的名称（用于限流统计），默认与 path 相同
+        """
+        node = self._root
+        for segment in path.split("/"):
+            if segment:
+                node = node.children.setdefault(segment, _RouteNode())
+        if node.actions is None:
+            node.actions = {}
+        for method in methods or ("*",):
+            node.actions[method.upper()] = (action, endpoint or path)
+
+    def match(self, method, path):
+        """返回最长前缀匹配的 (动作, 规则名称)，没有匹配的规则时返回 None"""
+        node = self._root
+        matched = None
+        for segment in path.split("/"):
+            if not segment:
+                continue
+            node = node.children.get(segment)
+            if node is None:
+                break
+            actions = node.actions
+            if actions is not None:
+                matched = actions.get(method) or actions.get("*") or matched
+        return matched
+
+
+# 当前配置编译出的路由表，验证器创建和配置热重载后重新编译
+_route_table = None
+
+def compile_route_table(config):
+    """按配置编译路由表，配置中没有 route_protection 时使用默认规则"""
+    global _route_table
+    _route_table = RouteTable.from_config(config.get("route_protection", DEFAULT_ROUTE_PROTECTION))
+
+
+def install_route_table(config_path=DEFAULT_CONFIG_PATH):
+    """
+    安装中间件时编译路由表：只读取配置文件中的 route_protection，不创建验证器（保持延迟初始化）
+    配置文件缺失或损坏时按默认规则保护接口，这些接口因验证器无法创建而返回错误，其余接口照常处理
+    """
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[ComfyUI-License-Manager] 无法读取路由保护配置，使用默认规则: {e}")
+        config = {}
+    compile_route_table(config if isinstance(config, dict) else {})
+    add_config_listener(compile_route_table)
+
+
+def get_route_table():
+    """获取当前的路由表（未安装时按验证器的配置编译）"""
+    if _route_table is None:
+        compile_route_table(get_license_validator().config)
+        add_config_listener(compile_route_table)
+    return _route_table
+
+
+# 按许可证的任务配额（首次使用时按配置创建，配置重新加载后更新）
+_prompt_quota = None
+_prompt_quota_created = False
+_prompt_quota_config = None
+
+def get_prompt_quota():
+    """获取任务配额，未启用时返回 None"""
+    if not _prompt_quota_created:
+        configure_prompt_quota(get_license_validator().config)
+        add_config_listener(configure_prompt_quota)
+    return _prompt_quota
+
+
+def configure_prompt_quota(config):
+    """按 prompt_quota 配置创建或更新任务配额；只修改限制时保留已占用的名额"""
+    global _prompt_quota, _prompt_quota_created, _prompt_quota_config
+    quota_config = config.get("prompt_quota")
+    if _prompt_quota_created and quota_config == _prompt_quota_config:
+        return
+    quota = PromptQuota.from_config(quota_config)
+    if quota is not None and _prompt_quota is not None:
+        _prompt_quota.update_limits(quota)
+    else:
+        _prompt_quota = quota
+    _prompt_quota_config = copy.deepcopy(quota_config)
+    _prompt_quota_created = True
+
+
+def handle_execution_event(event, data):
+    """PromptServer.send_sync 发出的执行事件，任务结束时释放配额名额"""
+    # 名额只在 /prompt 通过检查后占用，配额尚未创建时没有需要释放的名额，也不必创建验证器
+    quota = _prompt_quota
+    if quota is not None:
+        quota.on_execution_event(event, data)
+
+
+# multipart 字段头中的 name 参数（不匹配 filename）
+_FIELD_NAME_RE = re.compile(r'content-disposition:[^\r\n]*;\s*name="([^"]*)"', re.IGNORECASE)
+
+
+def parse_first_field(prefix, delimiter, field_name):
+    """从 multipart 请求体开头解析第一个字段，字段名为 field_name 且不是文件时返回其值"""
+    if not prefix.startswith(delimiter + b'\r\n'):
+        return None
+    header_end = prefix.find(b'\r\n\r\n', len(delimiter))
+    if header_end == -1:
+        return None
+    headers = prefix[len(delimiter) + 2:header_end].decode('latin-1')
+    match = _FIELD_NAME_RE.search(headers)
+    if match is None or match.group(1) != field_name or 'filename=' in headers.lower():
+        return None
+    value_end = prefix.find(b'\r\n' + delimiter, header_end + 4)
+    if value_end == -1:
+        return None
+    return prefix[header_end + 4:value_end].decode('utf-8', 'replace').strip()
+
+
+class ReplayStreamReader:
+    """
+    请求体流的替身：先返回已读取的开头数据，再继续读取原始流
+    用于读取 multipart 第一个字段后把数据还给原始处理器（代替已弃用的 StreamReader.unread_data）
+    未覆盖的属性和方法转发给原始流
+    """
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __aiter__(self):
+        return AsyncStreamIterator(self.readline)
+
+    def iter_chunked(self, n):
+        self._stream.set_read_chunk_size(n)
+        return AsyncStreamIterator(lambda: self.read(n))
+
+    def iter_any(self):
+        return AsyncStreamIterator(self.readany)
+
+    def iter_chunks(self):
+        return ChunkTupleAsyncStreamIterator(self)
+
+    def _take(self, n=-1):
+        data = self._prefix if n < 0 else self._prefix[:n]
+        self._prefix = self._prefix[len(data):]
+        return data
+
+    def unread_data(self, data):
+        # aiohttp 的 multipart 解析器会对请求体流调用 unread_data
+        self._prefix = data + self._prefix
+
+    def is_eof(self):
+        return not self._prefix and self._stream.is_eof()
+
+    def at_eof(self):
+        return not self._prefix and self._stream.at_eof()
+
+    async def read(self, n=-1):
+        if not self._prefix:
+            return await self._stream.read(n)
+        if n < 0:
+            return self._take() + await self._stream.read()
+        return self._take(n)
+
+    async def readany(self):
+        if not self._prefix:
+            return await self._stream.readany()
+        return self._take()
+
+    async def readchunk(self):
+        if not self._prefix:
+            return await self._stream.readchunk()
+        return self._take(), False
+
+    async def readexactly(self, n):
+        data = self._take(n)
+        if len(data) < n:
+            data += await self._stream.readexactly(n - len(data))
+        return data
+
+    def read_nowait(self, n=-1):
+        if not self._prefix:
+            return self._stream.read_nowait(n)
+        return self._take(n)
+
+    async def readuntil(self, separator=b"\n", **kwargs):
+        index = self._prefix.find(separator)
+        if index != -1:
+            return self._take(index + len(separator))
+        data = self._take()
+        return data + await self._stream.readuntil(separator, **kwargs)
+
+    async def readline(self, **kwargs):
+        index = self._prefix.find(b"\n")
+        if index != -1:
+            return self._take(index + 1)
+        data = self._take()
+        return data + await self._stream.readline(**kwargs)
+
+
+async def read_multipart_license_key(request, field_name, max_bytes):
+    """
+    从 multipart 请求体的第一个字段读取卡密
+    最多读取 max_bytes 字节，读取的数据通过 ReplayStreamReader 还给请求体，原始处理器读到的请求体不变
+    """
+    boundary = parse_mimetype(request.headers.get('Content-Type', '')).parameters.get('boundary')
+    if not boundary:
+        return None
+    delimiter = b'--' + boundary.encode('latin-1')
+    content = request.content
+    prefix = b''
+    try:
+        while len(prefix) < max_bytes:
+            chunk = await content.read(max_bytes - len(prefix))
+            if not chunk:
+                break
+            prefix += chunk
+            # 读到第一个字段的结束分隔符即可
+            if prefix.find(b'\r\n' + delimiter, len(delimiter)) != -1:
+                break
+    finally:
+        if prefix:
+            # request.read() / request.post() 读取 _payload，request.content 缓存在 _cache 中，两处都要替换
+            request._payload = ReplayStreamReader(prefix, content)
+            request._cache.pop('content', None)
+    return parse_first_field(prefix, delimiter, field_name)
+
+
+def license_required_response():
+    return web.json_response({
+        'error': '需要有效的许可证密钥',
+        'code': 'LICENSE_REQUIRED'
+    }, status=401)
+
+
+def license_invalid_response(request, endpoint, result):
+    """许可证验证失败的响应：code 保持兼容，reason 为具体的结果代码"""
+    record_license_failure(request, endpoint, result)
+    return web.json_response({
+        'error': result.message,
+        'code': 'LICENSE_INVALID',
+        'reason': result.code
+    }, status=401)
+
+
+async def check_request_license(request, endpoint):
+    """
+    检查请求携带的许可证，返回 (拒绝响应, 卡密, 验证结果)
+    通过时拒绝响应为 None；没有走到验证这一步时卡密和验证结果为 None
+    """
+    # 失败次数过多的客户端在解密之前直接拒绝
+    limited = check_rate_limit(request, endpoint)
+    if limited is not None:
+        return limited, None, None
+
+    # 优先从请求头/查询参数读取卡密（或会话令牌），请求体原样交给原始处理器
+    license_key = get_request_license_key(request)
+    legacy_body = None
+
+    # 上传文件：卡密放在第一个表单字段中，只读取请求体开头
+    if not license_key and request.content_type == 'multipart/form-data':
+        config = get_license_validator().config.get("route_protection", {})
+        license_key = await read_multipart_license_key(
+            request,
+            config.get("multipart_key_field", "license_key"),
+            config.get("multipart_key_max_bytes", 16384)
+        )
+
+    # 兼容旧版前端：卡密放在JSON请求体中
+    elif not license_key and request.method == 'POST' and request.content_type == 'application/json':
+        try:
+            legacy_body = fast_json.loads(await request.read())
+        except ValueError:
+            # 空请求体或无效JSON视为未携带卡密（如 POST /interrupt），由原始处理器处理请求体
+            legacy_body = None
+        if isinstance(legacy_body, dict):
+            license_key = legacy_body.pop('license_key', None)
+            request[LEGACY_BODY_KEY] = legacy_body
+
+    if not license_key:
+        return license_required_response(), None, None
+
+    # 已验证的许可证命中缓存，会话令牌只需一次 HMAC 校验
+    result = await get_license_validator().avalidate_license(license_key)
+    if not result.ok:
+        return license_invalid_response(request, endpoint, result), license_key, result
+
+    if legacy_body is not None:
+        # 替换已缓存的请求体，原始处理器读取到的是移除license_key后的数据
+        request._read_bytes = fast_json.dumps(legacy_body)
+    return None, license_key, result
+
+
+def response_prompt_id(response):
+    """从 /prompt 的 JSON 响应中取出 prompt_id，没有时返回 None"""
+    body = getattr(response, 'body', None)
+    if response.status != 200 or not isinstance(body, bytes) or b'"prompt_id"' not in body:
+        return None
+    try:
+        data = fast_json.loads(body)
+    except ValueError:
+        return None
+    return data.get('prompt_id') if isinstance(data, dict) else None
+
+
+async def check_prompt_features(request, feature_index, license_data):
+    """工作流使用了许可证功能范围之外的节点时返回 403 响应，否则返回 None"""
+    if not feature_index:
+        return None
+    mask = feature_index.license_mask(license_data.get('features'))
+    # 许可证包含全部受限功能时不需要解析请求体
+    if mask == feature_index.all_features:
+        return None
+
+    body = request.get(LEGACY_BODY_KEY)
+    if body is None:
+        try:
+            body = fast_json.loads(await request.read())
+        except ValueError:
+            # 格式错误的请求体交给 ComfyUI 返回错误
+            return None
+    prompt = body.get('prompt') if isinstance(body, dict) else None
+    if not isinstance(prompt, dict):
+        return None
+
+    denied = feature_index.denied_nodes(prompt, mask)
+    if not denied:
+        return None
+    denied = sorted(denied)
+    return web.json_response({
+        'error': f'许可证不包含使用以下节点所需的功能: {", ".join(denied)}',
+        'code': 'LICENSE_FEATURE_DENIED',
+        'nodes': denied,
+        'features': feature_index.features_for(denied)
+    }, status=403)
+
+
+def quota_exceeded_response(reason, retry_after):
+    """超出任务配额的响应"""
+    if reason == "in_flight":
+        error = '该许可证正在执行的任务过多，请等待当前任务完成后再提交'
+    else:
+        error = '该许可证提交任务过于频繁，请稍后再试'
+    return web.json_response({
+        'error': error,
+        'code': 'PROMPT_QUOTA_EXCEEDED',
+        'reason': reason
+    }, status=429, headers={'Retry-After': str(math.ceil(retry_after))})
+
+
+async def release_deleted_prompts(request, quota):
+    """从队列中删除或清空任务后归还对应的配额名额"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return
+    if not isinstance(data, dict):
+        return
+    if data.get('clear'):
+        quota.release_pending()
+    elif isinstance(data.get('delete'), list):
+        quota.release_pending(data['delete'])
+
+
+@web.middleware
+async def license_middleware(request, handler):
+    """按路由表检查需要许可证的请求"""
+    rule = get_route_table().match(request.method, request.path)
+    if rule is None or rule[0] != PROTECT:
+        return await handler(request)
+
+    endpoint = rule[1]
+    start = time.perf_counter()
+    if endpoint != "/prompt":
+        return await handle_protected(request, handler, endpoint, start)
+    # /prompt 的端到端耗时：许可证检查 + 功能/配额检查 + ComfyUI 处理器
+    try:
+        return await handle_protected(request, handler, endpoint, start)
+    finally:
+        metrics.prompt_seconds.observe(time.perf_counter() - start)
+
+
+async def handle_protected(request, handler, endpoint, start):
+    """检查许可证、功能和任务配额，通过后调用处理器"""
+    license_key = result = None
+    try:
+        rejected, license_key, result = await check_request_license(request, endpoint)
+    except Exception as e:
+        rejected = web.json_response({
+            'error': f'处理请求时出错: {str(e)}',
+            'code': 'PROCESSING_ERROR'
+        }, status=500)
+    finally:
+        metrics.middleware_seconds.observe(time.perf_counter() - start)
+
+    if result is None:
+        return rejected
+    validator = get_license_validator()
+    quota = None
+    if rejected is None and endpoint == "/prompt":
+        rejected = await check_prompt_features(request, validator.feature_index, result.data)
+        quota = get_prompt_quota() if rejected is None else None
+    if quota is not None:
+        license_id = result.license_id
+        exceeded = quota.acquire(license_id, result.data)
+        if exceeded is not None:
+            metrics.quota_rejections.inc(exceeded[0])
+            rejected = quota_exceeded_response(*exceeded)
+    if rejected is not None:
+        validator.audit("request", license_key, result,
+                        path=request.path, method=request.method, remote=request.remote,
+                        status=rejected.status)
+        return rejected
+
+    try:
+        response = await handler(request)
+    except BaseException:
+        if quota is not None:
+            quota.cancel(license_id)
+        raise
+
+    prompt_id = response_prompt_id(response) if endpoint == "/prompt" else None
+    if quota is not None:
+        # 任务结束事件到达时释放名额；没有创建任务时立即归还
+        if prompt_id is not None:
+            quota.bind(license_id, prompt_id)
+        else:
+            quota.cancel(license_id)
+    elif endpoint == "/queue" and request.method == "POST" and response.status == 200:
+        prompt_quota = get_prompt_quota()
+        if prompt_quota is not None:
+            await release_deleted_prompts(request, prompt_quota)
+
+    # 记录哪个许可证提交了哪个任务
+    validator.audit("request", license_key, result,
+                    path=request.path, method=request.method, remote=request.remote,
+                    status=response.status, prompt_id=prompt_id)
+    return response
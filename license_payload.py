@@ -0,0 +1,106 @@
+"""
+ComfyUI License Manager 许可证明文格式
+Fernet 解密后的明文有两种格式，按第一个字节区分：
+- JSON 对象（以 "{" 或空白开头）：旧格式，键名冗长，每次验证都要解析 JSON
+- 紧凑格式（版本号字节 0x02）：定长结构 + 功能位掩码 + 短用户ID，
+  明文约 20 字节（JSON 约 120 字节），卡密相应变短，解析只需一次 struct 解包
+
+紧凑格式布局（大端）：
+    偏移  长度  字段
+    0     1     版本号 0x02
+    1     4     expire_time（无符号，0 表示永不过期）
+    5     4     max_uses（有符号，-1 表示无限）
+    9     4     current_uses
+    13    4     features 位掩码，第 i 位对应功能表的第 i 项
+    17    1     user_id 字节长度
+    18    n     user_id（UTF-8）
+
+功能表取自 license_config.json 的 payload_features（未设置时为 features），
+已签发的卡密按位序解释，因此功能表只能在末尾追加
+"""
+
+import struct
+
+try:
+    from . import fast_json
+except ImportError:
+    import fast_json
+
+COMPACT_VERSION = 2
+_VERSION_BYTE = bytes([COMPACT_VERSION])
+_JSON_WHITESPACE = (b'\t', b'\n', b'\r')
+_HEADER = struct.Struct(">BIiIIB")
+# 位掩码宽度
+MAX_FEATURES = 32
+
+
+def decode_license_payload(data, feature_table=()):
+    """解析解密后的明文，返回许可证数据字典，格式错误时抛出 ValueError"""
+    if data[:1] == _VERSION_BYTE:
+        if len(data) < _HEADER.size:
+            raise ValueError("紧凑许可证长度不足")
+        _, expire_time, max_uses, current_uses, mask, user_id_length = _HEADER.unpack_from(data)
+        if len(data) != _HEADER.size + user_id_length:
+            raise ValueError("紧凑许可证长度与用户ID长度不符")
+        return {
+            'user_id': data[_HEADER.size:].decode('utf-8'),
+            'expire_time': expire_time or -1,
+            'max_uses': max_uses,
+            'current_uses': current_uses,
+            'features': mask_features(mask, feature_table)
+        }
+    # 其余控制字符保留给以后的二进制格式；JSON 明文可能以空白开头
+    if data[:1] < b' ' and data[:1] not in _JSON_WHITESPACE:
+        raise ValueError(f"不支持的许可证格式版本: {data[0] if data else None}")
+    return fast_json.loads(data)
+
+
+def mask_features(mask, feature_table=()):
+    """把功能位掩码还原为功能名列表"""
+    features = []
+    bit = 0
+    while mask:
+        # 超出功能表的位（配置落后于生成器）忽略
+        if mask & 1 and bit < len(feature_table):
+            features.append(feature_table[bit])
+        mask >>= 1
+        bit += 1
+    return features
+
+
+def is_compact_payload(data):
+    """明文是否为紧凑格式"""
+    return data[:1] == _VERSION_BYTE
+
+
+def encode_license_payload(license_data, feature_table=()):
+    """
+    把许可证数据编码为紧凑格式（供生成器使用）
+    只能包含 user_id、expire_time、max_uses、current_uses、features 五个字段，
+    features 必须都在功能表中，否则抛出 ValueError（此时应继续使用 JSON 格式）
+    """
+    extra = set(license_data) - {'user_id', 'expire_time', 'max_uses', 'current_uses', 'features'}
+    if extra:
+        raise ValueError(f"紧凑格式不支持这些字段: {', '.join(sorted(extra))}")
+    bits = {feature: 1 << bit for bit, feature in enumerate(feature_table[:MAX_FEATURES])}
+    mask = 0
+    for feature in license_data['features']:
+        if feature not in bits:
+            raise ValueError(f"功能不在功能表中: {feature}")
+        mask |= bits[feature]
+    user_id = str(license_data['user_id']).encode('utf-8')
+    if len(user_id) > 255:
+        raise ValueError("用户ID超过 255 字节")
+    expire_time = license_data['expire_time']
+    if expire_time == -1:
+        expire_time = 0
+    elif not 0 < expire_time < 2 ** 32:
+        raise ValueError(f"过期时间超出范围: {expire_time}")
+    try:
+        header = _HEADER.pack(
+            COMPACT_VERSION, int(expire_time), license_data['max_uses'],
+            license_data.get('current_uses', 0), mask, len(user_id)
+        )
+    except struct.error as e:
+        raise ValueError(f"数值字段超出范围: {e}")
+    return header + user_id
@@ -0,0 +1,173 @@
+"""
+ComfyUI License Manager 任务配额
+按许可证限制同时排队/执行的任务数（max_in_flight）和每分钟提交的任务数（per_minute），
+防止单个许可证占满 ComfyUI 队列
+
+提交 /prompt 时先占用一个名额，处理器返回 prompt_id 后与之绑定；
+ComfyUI 通过 send_sync 发出任务结束事件（execution_success / execution_error /
+execution_interrupted，旧版本为 node 为空的 executing）时释放名额。
+所有操作都是字典查找和计数，与许可证数量和队列长度无关
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+# 任务结束时 ComfyUI 发出的事件
+FINISHED_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
+
+
+class PromptQuota:
+    """
+    按许可证的任务配额
+    许可证数据中的 max_in_flight / prompts_per_minute 字段可覆盖配置中的默认值，0 表示不限制
+    """
+    # 任务结束事件先于 prompt_id 绑定到达时暂存的数量上限
+    EARLY_FINISHED_LIMIT = 1024
+
+    def __init__(self, max_in_flight=4, per_minute=60, busy_retry_after=5,
+                 slot_timeout=3600, max_entries=65536):
+        self.max_in_flight = max_in_flight
+        self.per_minute = per_minute
+        self.busy_retry_after = busy_retry_after
+        self.slot_timeout = slot_timeout
+        self.max_entries = max_entries
+        self.rejected = 0
+        # 许可证 -> 占用的名额数
+        self._in_flight = {}
+        # prompt_id -> [许可证, 占用时间, 是否已开始执行]（按占用时间排序）
+        self._prompts = OrderedDict()
+        # 许可证 -> [剩余令牌, 上次更新时间]
+        self._buckets = {}
+        # 绑定之前就已结束的 prompt_id
+        self._finished_early = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 license_config.json 的 prompt_quota 配置创建配额，未启用时返回 None"""
+        config = config or {}
+        if not config.get("enabled", True):
+            return None
+        return cls(
+            max_in_flight=config.get("max_in_flight", 4),
+            per_minute=config.get("per_minute", 60),
+            busy_retry_after=config.get("busy_retry_after", 5),
+            slot_timeout=config.get("slot_timeout", 3600),
+            max_entries=config.get("max_entries", 65536)
+        )
+
+    def update_limits(self, other):
+        """配置热重载时采用 other 的限制，保留已占用的名额和令牌桶"""
+        with self._lock:
+            self.max_in_flight = other.max_in_flight
+            self.per_minute = other.per_minute
+            self.busy_retry_after = other.busy_retry_after
+            self.slot_timeout = other.slot_timeout
+            self.max_entries = other.max_entries
+
+    def _expire(self, now):
+        """释放超过 slot_timeout 仍未结束的名额（如 ComfyUI 重启后丢失的任务）"""
+        prompts = self._prompts
+        while prompts:
+            prompt_id, slot = next(iter(prompts.items()))
+            if now - slot[1] < self.slot_timeout:
+                break
+            prompts.popitem(last=False)
+            self._decrement(slot[0])
+
+    def _decrement(self, license_id):
+        count = self._in_flight.get(license_id, 0) - 1
+        if count > 0:
+            self._in_flight[license_id] = count
+        else:
+            self._in_flight.pop(license_id, None)
+
+    def acquire(self, license_id, license_data=None):
+        """
+        为许可证占用一个名额
+        成功时返回 None，超出配额时返回 (原因, 需要等待的秒数)，原因为 in_flight 或 per_minute
+        """
+        license_data = license_data or {}
+        max_in_flight = license_data.get('max_in_flight', self.max_in_flight)
+        per_minute = license_data.get('prompts_per_minute', self.per_minute)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if max_in_flight > 0 and self._in_flight.get(license_id, 0) >= max_in_flight:
+                self.rejected += 1
+                return "in_flight", self.busy_retry_after
+
+            if per_minute > 0:
+                bucket = self._buckets.get(license_id)
+                if bucket is None:
+                    # 超出容量时淘汰最早加入的桶
+                    if len(self._buckets) >= self.max_entries:
+                        self._buckets.pop(next(iter(self._buckets)))
+                    bucket = self._buckets[license_id] = [per_minute, now]
+                else:
+                    bucket[0] = min(per_minute, bucket[0] + (now - bucket[1]) * per_minute / 60)
+                    bucket[1] = now
+                if bucket[0] < 1:
+                    self.rejected += 1
+                    return "per_minute", (1 - bucket[0]) * 60 / per_minute
+                bucket[0] -= 1
+
+            self._in_flight[license_id] = self._in_flight.get(license_id, 0) + 1
+        return None
+
+    def bind(self, license_id, prompt_id):
+        """把占用的名额与处理器返回的 prompt_id 绑定，任务结束时释放"""
+        with self._lock:
+            if self._finished_early.pop(prompt_id, None) is not None:
+                self._decrement(license_id)
+                return
+            self._prompts[prompt_id] = [license_id, time.monotonic(), False]
+
+    def cancel(self, license_id):
+        """处理器没有创建任务（出错或被 ComfyUI 拒绝）时归还名额"""
+        with self._lock:
+            self._decrement(license_id)
+
+    def release(self, prompt_id):
+        """任务结束，释放名额"""
+        with self._lock:
+            slot = self._prompts.pop(prompt_id, None)
+            if slot is not None:
+                self._decrement(slot[0])
+                return
+            # 名额还没来得及绑定（任务极快完成），绑定时直接释放
+            self._finished_early[prompt_id] = True
+            if len(self._finished_early) > self.EARLY_FINISHED_LIMIT:
+                self._finished_early.popitem(last=False)
+
+    def release_pending(self, prompt_ids=None):
+        """从队列中删除尚未开始执行的任务时释放名额，prompt_ids 为空表示清空队列"""
+        with self._lock:
+            if prompt_ids is None:
+                prompt_ids = [prompt_id for prompt_id, slot in self._prompts.items() if not slot[2]]
+            for prompt_id in prompt_ids:
+                slot = self._prompts.get(prompt_id)
+                if slot is not None and not slot[2]:
+                    del self._prompts[prompt_id]
+                    self._decrement(slot[0])
+
+    def on_execution_event(self, event, data):
+        """处理 PromptServer.send_sync 发出的事件"""
+        if not isinstance(data, dict):
+            return
+        prompt_id = data.get('prompt_id')
+        if prompt_id is None:
+            return
+        if event == "execution_start":
+            with self._lock:
+                slot = self._prompts.get(prompt_id)
+                if slot is not None:
+                    slot[2] = True
+        elif event in FINISHED_EVENTS or (event == "executing" and data.get('node') is None):
+            # 结束事件可能重复到达（executing 与 execution_success），重复释放无影响
+            self.release(prompt_id)
+
+    def stats(self):
+        """返回配额统计信息"""
+        return {"licenses": len(self._in_flight), "prompts": len(self._prompts), "rejected": self.rejected}
@@ -0,0 +1,86 @@
+"""
+ComfyUI License Manager 验证失败限流
+按 (客户端地址, 端点) 维护令牌桶：每次验证失败消耗一个令牌，
+令牌耗尽后在进行任何解密操作之前直接返回 429
+"""
+
+import time
+import threading
+
+
+class RateLimiter:
+    """
+    令牌桶限流器
+    rate 为每秒恢复的令牌数，burst 为桶容量；endpoints 可为单个端点覆盖这两个值
+    """
+    def __init__(self, rate=1.0, burst=10, endpoints=None, max_entries=65536):
+        self.rate = rate
+        self.burst = burst
+        self.endpoints = endpoints or {}
+        self.max_entries = max_entries
+        self.rejected = 0
+        # (地址, 端点) -> [剩余令牌, 上次更新时间]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 license_config.json 的 rate_limit 配置创建限流器，未启用时返回 None"""
+        config = config or {}
+        if not config.get("enabled", True):
+            return None
+        endpoints = {
+            path: (limits.get("rate", config.get("rate", 1.0)), limits.get("burst", config.get("burst", 10)))
+            for path, limits in (config.get("endpoints") or {}).items()
+        }
+        return cls(
+            rate=config.get("rate", 1.0),
+            burst=config.get("burst", 10),
+            endpoints=endpoints,
+            max_entries=config.get("max_entries", 65536)
+        )
+
+    def _limits(self, endpoint):
+        return self.endpoints.get(endpoint) or (self.rate, self.burst)
+
+    def _refill(self, key, now):
+        """按流逝时间补充令牌，返回桶（不存在时返回 None，表示桶是满的）"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return None
+        rate, burst = self._limits(key[1])
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        return bucket
+
+    def retry_after(self, remote, endpoint):
+        """令牌耗尽时返回需要等待的秒数，否则返回 0"""
+        key = (remote, endpoint)
+        if key not in self._buckets:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._refill(key, now)
+            if bucket is None or bucket[0] >= 1:
+                return 0
+            self.rejected += 1
+            rate, _ = self._limits(endpoint)
+            return (1 - bucket[0]) / rate if rate > 0 else 60
+
+    def penalize(self, remote, endpoint):
+        """记录一次验证失败，消耗一个令牌"""
+        key = (remote, endpoint)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._refill(key, now)
+            if bucket is None:
+                # 超出容量时淘汰最早加入的桶，防止被伪造地址撑爆内存
+                if len(self._buckets) >= self.max_entries:
+                    self._buckets.pop(next(iter(self._buckets)))
+                _, burst = self._limits(endpoint)
+                bucket = self._buckets[key] = [burst, now]
+            bucket[0] = max(0.0, bucket[0] - 1)
+
+    def stats(self):
+        """返回限流统计信息"""
+        return {"tracked": len(self._buckets), "rejected": self.rejected}
@@ -0,0 +1,138 @@
+"""
+ComfyUI License Manager 吊销列表
+在许可证到期前吊销泄露的卡密
+
+条目格式（文件中每行一条，# 开头为注释）：
+    digest:<32位十六进制>  按卡密摘要吊销，解密之前即可拒绝
+    user:<用户ID>          吊销该用户的全部卡密，解密（或命中缓存）之后检查
+    其他内容               视为完整卡密，按其摘要吊销
+
+条目保存在内存中的哈希集合里，验证时的检查只是一次集合查询（几十纳秒），
+与吊销数量无关；更新时按差异增量修改集合，不会重建
+"""
+
+import os
+import threading
+
+DIGEST_PREFIX = "digest:"
+USER_PREFIX = "user:"
+
+
+class RevocationList:
+    """
+    吊销列表
+    条目来自多个来源（共享状态后端、吊销文件），任一来源包含即视为吊销
+    """
+    def __init__(self, key_digest):
+        # 计算卡密摘要的函数（与验证缓存使用同一个摘要）
+        self.key_digest = key_digest
+        self.digests = set()
+        self.user_ids = set()
+        self._sources = {"stored": set(), "file": set()}
+        self._lock = threading.Lock()
+        self._file_path = None
+        self._file_signature = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self.digests) + len(self.user_ids)
+
+    def normalize(self, entry):
+        """把卡密/摘要/用户ID 统一为 digest:... 或 user:... 形式，空行和注释返回 None"""
+        entry = entry.strip()
+        if not entry or entry.startswith("#"):
+            return None
+        if entry.startswith(DIGEST_PREFIX):
+            digest = bytes.fromhex(entry[len(DIGEST_PREFIX):])
+            if len(digest) != 16:
+                raise ValueError(f"摘要长度错误: {entry}")
+            return DIGEST_PREFIX + digest.hex()
+        if entry.startswith(USER_PREFIX):
+            return entry
+        return DIGEST_PREFIX + self.key_digest(entry).hex()
+
+    def _add(self, entry):
+        if entry.startswith(DIGEST_PREFIX):
+            self.digests.add(bytes.fromhex(entry[len(DIGEST_PREFIX):]))
+        else:
+            self.user_ids.add(entry[len(USER_PREFIX):])
+
+    def _discard(self, entry):
+        if entry.startswith(DIGEST_PREFIX):
+            self.digests.discard(bytes.fromhex(entry[len(DIGEST_PREFIX):]))
+        else:
+            self.user_ids.discard(entry[len(USER_PREFIX):])
+
+    def update(self, source, add=(), remove=()):
+        """增量修改某个来源的条目（条目须已 normalize）"""
+        with self._lock:
+            entries = self._sources[source]
+            for entry in add:
+                entries.add(entry)
+                self._add(entry)
+            for entry in remove:
+                entries.discard(entry)
+                if not any(entry in other for other in self._sources.values()):
+                    self._discard(entry)
+
+    def replace(self, source, entries):
+        """用新的完整条目集合替换某个来源，只修改有差异的部分"""
+        entries = set(entries)
+        current = self._sources[source]
+        self.update(source, add=entries - current, remove=current - entries)
+
+    def is_revoked(self, license_data):
+        """检查已解密的许可证所属用户是否被吊销"""
+        user_ids = self.user_ids
+        return bool(user_ids) and str(license_data.get('user_id')) in user_ids
+
+    # -- 吊销文件 --
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self._file_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load_file(self, path=None):
+        """读取吊销文件，文件不存在时视为空；格式错误的行会被跳过"""
+        if path is not None:
+            self._file_path = path
+        if not self._file_path:
+            return
+        self._file_signature = self._stat_signature()
+        entries = set()
+        if self._file_signature is not None:
+            with open(self._file_path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        entry = self.normalize(line)
+                    except ValueError as e:
+                        print(f"[License Validator] 吊销文件第 {line_number} 行无效: {e}")
+                        continue
+                    if entry is not None:
+                        entries.add(entry)
+        self.replace("file", entries)
+
+    def start_watcher(self, interval=2.0):
+        """按间隔检查吊销文件，变化时重新读取"""
+        if not self._file_path or self._thread is not None or interval is None or interval < 0:
+            return
+        self._thread = threading.Thread(
+            target=self._watch, args=(interval,), name="license-revocation-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            if self._stat_signature() != self._file_signature:
+                try:
+                    self.load_file()
+                    print(f"[License Validator] 吊销列表已重新加载，共 {len(self)} 条")
+                except OSError as e:
+                    print(f"[License Validator] 吊销文件读取失败: {e}")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,126 @@
+"""
+ComfyUI License Manager 会话令牌
+用已验证的许可证换取短期会话令牌，之后的请求只需一次 HMAC 校验，无需解密许可证
+
+令牌自带校验所需的许可证数据，不依赖签发进程的内存，任一进程/节点都能校验，重启后依然有效
+令牌格式: "s1." + base64url(载荷 + 签名)
+    载荷（大端）:
+        偏移  长度  字段
+        0     1     版本号
+        1     4     会话过期时间
+        5     16    许可证摘要
+        21    4     expire_time（0 表示永不过期）
+        25    4     max_uses（有符号，-1 表示无限）
+        29    4     current_uses
+        33    4     features 位掩码（按功能表，与紧凑格式卡密相同）
+        37    2     max_in_flight（0xFFFF 表示未设置）
+        39    2     prompts_per_minute（0xFFFF 表示未设置）
+        41    1     user_id 字节长度
+        42    1     license_id 字节长度（0 表示未设置）
+        43    n     user_id + license_id（UTF-8）
+    签名: HMAC-SHA256(载荷) 的前 16 字节
+"""
+
+import hmac
+import base64
+import struct
+import hashlib
+import binascii
+
+try:
+    from .license_payload import MAX_FEATURES, mask_features
+except ImportError:
+    from license_payload import MAX_FEATURES, mask_features
+
+SESSION_PREFIX = "s1."
+SESSION_VERSION = 2
+
+_HEADER = struct.Struct(">BI16sIiIIHHBB")
+_MAC_SIZE = 16
+_UNSET = 0xFFFF
+# user_id 与 license_id 各不超过 255 字节
+_MAX_TOKEN_LENGTH = len(SESSION_PREFIX) + len(base64.urlsafe_b64encode(b"\0" * (_HEADER.size + 510 + _MAC_SIZE)))
+
+
+def derive_session_secret(config, primary_key):
+    """会话签名密钥：优先使用配置中的 session.secret，否则由主加密密钥派生"""
+    secret = (config.get("session") or {}).get("secret")
+    if secret:
+        return secret.encode()
+    return hmac.new(primary_key.encode(), b"comfyui-license-session", hashlib.sha256).digest()
+
+
+def _sign(secret, payload):
+    return hmac.new(secret, payload, hashlib.sha256).digest()[:_MAC_SIZE]
+
+
+def _optional_limit(value):
+    return _UNSET if value is None else value
+
+
+def sign_session(secret, digest, expires_at, license_data, feature_table=()):
+    """
+    生成会话令牌，license_data 为签发时已验证的许可证数据
+    只保存功能表中的功能；字段超出范围时抛出 ValueError
+    """
+    bits = {feature: 1 << bit for bit, feature in enumerate(feature_table[:MAX_FEATURES])}
+    mask = 0
+    for feature in license_data['features']:
+        mask |= bits.get(feature, 0)
+    user_id = str(license_data['user_id']).encode('utf-8')
+    license_id = str(license_data.get('license_id') or "").encode('utf-8')
+    if len(user_id) > 255 or len(license_id) > 255:
+        raise ValueError("用户ID或许可证ID超过 255 字节")
+    expire_time = license_data['expire_time']
+    try:
+        payload = _HEADER.pack(
+            SESSION_VERSION, int(expires_at), digest,
+            0 if expire_time == -1 else int(expire_time), license_data['max_uses'],
+            license_data.get('current_uses', 0), mask,
+            _optional_limit(license_data.get('max_in_flight')),
+            _optional_limit(license_data.get('prompts_per_minute')),
+            len(user_id), len(license_id)
+        ) + user_id + license_id
+    except struct.error as e:
+        raise ValueError(f"数值字段超出范围: {e}")
+    return SESSION_PREFIX + base64.urlsafe_b64encode(payload + _sign(secret, payload)).rstrip(b"=").decode()
+
+
+def verify_session(secret, token, feature_table=()):
+    """
+    校验会话令牌签名，返回 (许可证摘要, 过期时间, 许可证数据)，格式或签名错误时返回 None
+    不检查是否过期
+    """
+    if len(token) > _MAX_TOKEN_LENGTH or not token.startswith(SESSION_PREFIX):
+        return None
+    body = token[len(SESSION_PREFIX):]
+    try:
+        raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+    except (ValueError, binascii.Error):
+        return None
+    if len(raw) < _HEADER.size + _MAC_SIZE:
+        return None
+
+    payload, mac = raw[:-_MAC_SIZE], raw[-_MAC_SIZE:]
+    if not hmac.compare_digest(mac, _sign(secret, payload)):
+        return None
+    (version, expires_at, digest, expire_time, max_uses, current_uses, mask,
+     max_in_flight, prompts_per_minute, user_id_length, license_id_length) = _HEADER.unpack_from(payload)
+    if version != SESSION_VERSION or len(payload) != _HEADER.size + user_id_length + license_id_length:
+        return None
+
+    strings = payload[_HEADER.size:]
+    license_data = {
+        'user_id': strings[:user_id_length].decode('utf-8'),
+        'expire_time': expire_time or -1,
+        'max_uses': max_uses,
+        'current_uses': current_uses,
+        'features': mask_features(mask, feature_table)
+    }
+    if license_id_length:
+        license_data['license_id'] = strings[user_id_length:].decode('utf-8')
+    if max_in_flight != _UNSET:
+        license_data['max_in_flight'] = max_in_flight
+    if prompts_per_minute != _UNSET:
+        license_data['prompts_per_minute'] = prompts_per_minute
+    return digest, expires_at, license_data
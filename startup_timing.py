@@ -0,0 +1,51 @@
+"""
+ComfyUI License Manager 启动耗时统计
+记录插件加载各阶段的耗时；延迟初始化的阶段在实际发生时输出
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """按阶段记录耗时"""
+    def __init__(self, prefix="[ComfyUI-License-Manager]"):
+        self.prefix = prefix
+        self.phases = []
+        self.reported = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """统计一个阶段的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases.append((name, elapsed))
+            # 启动报告输出之后发生的阶段（延迟初始化）单独输出
+            if self.reported:
+                print(f"{self.prefix} 延迟初始化 {name}: {elapsed * 1000:.1f}ms")
+
+    def report(self):
+        """生成启动耗时报告"""
+        self.reported = True
+        with self._lock:
+            phases = list(self.phases)
+        total = sum(elapsed for _, elapsed in phases)
+        lines = [f"{self.prefix} 启动耗时 {total * 1000:.1f}ms"]
+        for name, elapsed in phases:
+            lines.append(f"{self.prefix}   {name}: {elapsed * 1000:.1f}ms")
+        return "\n".join(lines)
+
+    def as_dict(self):
+        """以字典形式返回各阶段耗时（秒）"""
+        with self._lock:
+            return {name: elapsed for name, elapsed in self.phases}
+
+
+# 全局启动计时器
+startup_timer = StartupTimer()
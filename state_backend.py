@@ -0,0 +1,327 @@
+"""
+ComfyUI License Manager 共享状态后端
+多个 ComfyUI 实例（多进程/多节点）共享的许可证状态：
+- 使用次数计数（由 UsageLedger 在内存中累加后批量写入）
+- 吊销列表
+- 事件广播（缓存失效、使用次数更新），每个节点收到后只修改本地内存
+
+后端：
+- MemoryStateBackend: 纯内存，仅限单进程（用于测试）
+- SQLiteStateBackend: 默认后端，WAL 模式，同一台机器上的多个进程共享一个文件，事件通过轮询事件表传递
+- RedisStateBackend: 多节点部署，批量写入使用 pipeline，事件通过 publish/subscribe 传递（需要安装 redis 包）
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class MemoryStateBackend:
+    """内存状态后端（进程退出后数据丢失）"""
+    def __init__(self):
+        self._counts = {}
+        self._revocations = set()
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def load(self, license_id):
+        """读取已持久化的使用次数"""
+        with self._lock:
+            return self._counts.get(license_id, 0)
+
+    def load_many(self, license_ids):
+        """批量读取已持久化的使用次数，返回 {license_id: 次数}（没有记录的省略）"""
+        with self._lock:
+            return {license_id: self._counts[license_id] for license_id in license_ids if license_id in self._counts}
+
+    def add_many(self, increments):
+        """批量累加使用次数，返回这些许可证的最新总数"""
+        with self._lock:
+            for license_id, count in increments.items():
+                self._counts[license_id] = self._counts.get(license_id, 0) + count
+            return {license_id: self._counts[license_id] for license_id in increments}
+
+    def load_revocations(self):
+        """读取全部吊销条目"""
+        with self._lock:
+            return set(self._revocations)
+
+    def add_revocations(self, values):
+        with self._lock:
+            self._revocations.update(values)
+
+    def remove_revocations(self, values):
+        with self._lock:
+            self._revocations.difference_update(values)
+
+    def publish(self, message):
+        """广播事件（message 为字符串）"""
+        for callback in list(self._subscribers):
+            callback(message)
+
+    def subscribe(self, callback):
+        """订阅事件，callback 在后台线程中以消息字符串调用"""
+        self._subscribers.append(callback)
+
+    def close(self):
+        self._subscribers.clear()
+
+
+class SQLiteStateBackend:
+    """SQLite 状态后端（WAL 模式）"""
+    # SQLite 单条语句的参数数量上限较低，分批查询
+    QUERY_CHUNK = 500
+    # 事件表保留时间（秒）
+    EVENT_RETENTION = 300
+
+    def __init__(self, path, poll_interval=1.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        try:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS license_usage ("
+                    "license_id TEXT PRIMARY KEY, "
+                    "uses INTEGER NOT NULL DEFAULT 0, "
+                    "updated_at REAL NOT NULL)"
+                )
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS license_revocations ("
+                    "value TEXT PRIMARY KEY, "
+                    "created_at REAL NOT NULL)"
+                )
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS license_events ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "message TEXT NOT NULL, "
+                    "created_at REAL NOT NULL)"
+                )
+        except sqlite3.Error:
+            self._conn.close()
+            raise
+        self._published = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self, license_id):
+        """读取已持久化的使用次数"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uses FROM license_usage WHERE license_id = ?", (license_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def load_many(self, license_ids):
+        """分批查询已持久化的使用次数，返回 {license_id: 次数}（没有记录的省略）"""
+        license_ids = list(license_ids)
+        counts = {}
+        with self._lock:
+            for i in range(0, len(license_ids), self.QUERY_CHUNK):
+                chunk = license_ids[i:i + self.QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                counts.update(self._conn.execute(
+                    f"SELECT license_id, uses FROM license_usage WHERE license_id IN ({placeholders})",
+                    chunk
+                ).fetchall())
+        return counts
+
+    def add_many(self, increments):
+        """在一个事务中批量累加使用次数，返回这些许可证的最新总数"""
+        now = time.time()
+        license_ids = list(increments)
+        totals = {}
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO license_usage (license_id, uses, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(license_id) DO UPDATE SET "
+                    "uses = uses + excluded.uses, updated_at = excluded.updated_at",
+                    [(license_id, increments[license_id], now) for license_id in license_ids]
+                )
+            for i in range(0, len(license_ids), self.QUERY_CHUNK):
+                chunk = license_ids[i:i + self.QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT license_id, uses FROM license_usage WHERE license_id IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                totals.update(rows)
+        return totals
+
+    def load_revocations(self):
+        """读取全部吊销条目"""
+        with self._lock:
+            rows = self._conn.execute("SELECT value FROM license_revocations").fetchall()
+        return {row[0] for row in rows}
+
+    def add_revocations(self, values):
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO license_revocations (value, created_at) VALUES (?, ?)",
+                    [(value, now) for value in values]
+                )
+
+    def remove_revocations(self, values):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM license_revocations WHERE value = ?", [(value,) for value in values]
+                )
+
+    def publish(self, message):
+        """写入事件表，其他进程轮询读取"""
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO license_events (message, created_at) VALUES (?, ?)", (message, now)
+                )
+                self._published += 1
+                # 定期清理过期事件
+                if self._published % 100 == 1:
+                    self._conn.execute(
+                        "DELETE FROM license_events WHERE created_at < ?", (now - self.EVENT_RETENTION,)
+                    )
+
+    def subscribe(self, callback):
+        """启动轮询线程，只接收订阅之后发布的事件"""
+        with self._lock:
+            last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM license_events").fetchone()[0]
+        self._thread = threading.Thread(
+            target=self._poll, args=(callback, last_id), name="license-state-events", daemon=True
+        )
+        self._thread.start()
+
+    def _poll(self, callback, last_id):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                with self._lock:
+                    rows = self._conn.execute(
+                        "SELECT id, message FROM license_events WHERE id > ? ORDER BY id", (last_id,)
+                    ).fetchall()
+            except sqlite3.Error as e:
+                print(f"[License Validator] 读取状态事件失败: {e}")
+                continue
+            for event_id, message in rows:
+                last_id = event_id
+                callback(message)
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            self._conn.close()
+
+
+class RedisStateBackend:
+    """
+    Redis 状态后端（兼容 Redis 协议的服务均可）
+    使用次数保存在一个哈希表中，批量写入通过 pipeline 一次往返完成
+    """
+    def __init__(self, url="redis://127.0.0.1:6379/0", key_prefix="comfyui_license", client=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("使用 redis 状态后端需要安装 redis 包: pip install redis")
+            client = redis.Redis.from_url(url)
+        self._client = client
+        self._usage_key = f"{key_prefix}:usage"
+        self._revocations_key = f"{key_prefix}:revocations"
+        self._channel = f"{key_prefix}:events"
+        self._pubsub_thread = None
+
+    def load(self, license_id):
+        """读取已持久化的使用次数"""
+        value = self._client.hget(self._usage_key, license_id)
+        return int(value) if value is not None else 0
+
+    def load_many(self, license_ids):
+        """用一次 HMGET 批量读取使用次数，返回 {license_id: 次数}（没有记录的省略）"""
+        license_ids = list(license_ids)
+        if not license_ids:
+            return {}
+        values = self._client.hmget(self._usage_key, license_ids)
+        return {license_id: int(value) for license_id, value in zip(license_ids, values) if value is not None}
+
+    def add_many(self, increments):
+        """用一个 pipeline 批量累加使用次数，返回这些许可证的最新总数"""
+        license_ids = list(increments)
+        pipe = self._client.pipeline(transaction=False)
+        for license_id in license_ids:
+            pipe.hincrby(self._usage_key, license_id, increments[license_id])
+        return dict(zip(license_ids, pipe.execute()))
+
+    def load_revocations(self):
+        """读取全部吊销条目"""
+        return {_to_str(value) for value in self._client.smembers(self._revocations_key)}
+
+    def add_revocations(self, values):
+        values = list(values)
+        if values:
+            self._client.sadd(self._revocations_key, *values)
+
+    def remove_revocations(self, values):
+        values = list(values)
+        if values:
+            self._client.srem(self._revocations_key, *values)
+
+    def publish(self, message):
+        self._client.publish(self._channel, message)
+
+    def subscribe(self, callback):
+        """在后台线程中订阅事件频道"""
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self._channel: lambda item: callback(_to_str(item["data"]))})
+        self._pubsub_thread = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def close(self):
+        if self._pubsub_thread is not None:
+            self._pubsub_thread.stop()
+            self._pubsub_thread = None
+        self._client.close()
+
+
+def _to_str(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def create_state_backend(config, base_dir=""):
+    """
+    根据 license_config.json 创建状态后端
+    state_backend.type 未设置时沿用 usage_ledger.backend / usage_ledger.path 的旧配置
+    """
+    state_config = config.get("state_backend") or {}
+    ledger_config = config.get("usage_ledger") or {}
+    backend_type = state_config.get("type") or ledger_config.get("backend", "sqlite")
+
+    if backend_type == "memory":
+        return MemoryStateBackend()
+    if backend_type == "sqlite":
+        path = state_config.get("path") or ledger_config.get("path", "license_usage.db")
+        if not os.path.isabs(path):
+            path = os.path.join(base_dir, path)
+        try:
+            return SQLiteStateBackend(path, poll_interval=state_config.get("poll_interval", 1.0))
+        except (sqlite3.Error, OSError) as e:
+            # 只读安装目录等情况下不影响验证，只是使用次数和吊销条目不再持久化、不在进程间共享
+            print(f"[License Validator] 无法打开状态数据库 {path}，改用内存状态后端: {e}")
+            return MemoryStateBackend()
+    if backend_type == "redis":
+        return RedisStateBackend(
+            url=state_config.get("redis_url", "redis://127.0.0.1:6379/0"),
+            key_prefix=state_config.get("key_prefix", "comfyui_license")
+        )
+    raise ValueError(f"未知的状态后端: {backend_type}")
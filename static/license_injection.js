@@ -1,133 +1,216 @@
-// ComfyUI 卡密验证拦截器
+// ComfyUI 卡密验证拦截器 - 完整版本
 (function() {
     'use strict';
 
     let originalFetch = window.fetch;
-    let licenseKey = localStorage.getItem('comfyui_license_key') || '';
+    let licenseKey = '';  // 不从localStorage读取，每次都需要重新输入
+    let sessionToken = '';  // 用卡密换取的短期会话令牌，请求时代替卡密发送
+    let sessionExpires = 0;
+    let sessionRequest = null;
+    let sessionsEnabled = true;  // 服务器关闭会话令牌（/license/session 返回404）后直接发送卡密
+    let dialogShown = false;
 
-    // 重写fetch函数来拦截prompt请求
+    // 保存 /license/session 的返回结果
+    function setSession(result) {
+        sessionToken = result.session_token || '';
+        sessionExpires = result.expires_at || 0;
+    }
+
+    // 获取有效的会话令牌，快过期时重新换取；会话不可用时退回发送卡密
+    function getSessionToken() {
+        if (!sessionsEnabled) {
+            return Promise.resolve(licenseKey);
+        }
+        if (sessionToken && sessionExpires - Date.now() / 1000 > 30) {
+            return Promise.resolve(sessionToken);
+        }
+        if (!sessionRequest) {
+            sessionRequest = originalFetch('/license/session', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ license_key: licenseKey })
+            }).then(response => {
+                if (response.status === 404) {
+                    sessionsEnabled = false;
+                }
+                return response.json();
+            }).then(result => {
+                if (result.valid) {
+                    setSession(result);
+                } else {
+                    sessionToken = '';
+                }
+                return sessionToken || licenseKey;
+            }).catch(() => licenseKey).finally(() => {
+                sessionRequest = null;
+            });
+        }
+        return sessionRequest;
+    }
+
+    // 验证卡密：优先换取会话令牌，会话接口未启用或出错时改用 /license/validate
+    async function verifyLicenseKey(key) {
+        const body = JSON.stringify({ license_key: key });
+        if (sessionsEnabled) {
+            try {
+                const response = await originalFetch('/license/session', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: body
+                });
+                if (response.status === 404) {
+                    sessionsEnabled = false;
+                }
+                const result = await response.json();
+                // 只有验证结果（含 valid 字段）直接返回，其余错误退回普通验证
+                if (typeof result.valid === 'boolean') {
+                    return result;
+                }
+            } catch (error) {
+                console.log('[License] 会话接口不可用，改用普通验证:', error);
+            }
+        }
+        const response = await originalFetch('/license/validate', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: body
+        });
+        return response.json();
+    }
+
+    // 携带会话令牌发送请求，会话失效时重新换取并重试一次
+    function fetchWithLicense(target, url, options, retried) {
+        return getSessionToken().then(token => {
+            const headers = new Headers(options.headers || {});
+            headers.set('X-License-Key', token);
+            return originalFetch.call(target, url, Object.assign({}, options, { headers: headers })).then(response => {
+                if (response.status !== 401 || retried || token === licenseKey) {
+                    return response;
+                }
+                return response.clone().json().then(result => {
+                    const reason = result.reason || result.code || '';
+                    if (reason.indexOf('LICENSE_SESSION') !== 0) {
+                        return response;
+                    }
+                    console.log('[License] 会话已失效，重新换取');
+                    sessionToken = '';
+                    return fetchWithLicense(target, url, options, true);
+                }, () => response);
+            });
+        });
+    }
+
+    // 重写fetch函数来拦截所有请求
     window.fetch = function(url, options) {
-        // 检查是否是prompt提交请求
-        if (url.includes('/prompt') && options && options.method === 'POST') {
-            // 如果没有卡密，显示输入对话框
+        console.log('[License] 拦截请求:', url, options?.method);
+        
+        // 检查是否是需要验证的请求
+        const needsLicense = (
+            (url.includes('/prompt') && options?.method === 'POST') ||
+            (url.includes('/queue') && options?.method === 'POST') ||
+            (url.includes('/interrupt') && options?.method === 'POST') ||
+            (url.includes('/api/') && options?.method === 'POST') ||
+            url.includes('/upload/') ||
+            url.includes('/view') ||
+            url.includes('/history')
+        );
+        
+        if (needsLicense) {
+            console.log('[License] 需要验证的请求:', url);
+            
             if (!licenseKey) {
+                console.log('[License] 没有卡密，显示对话框');
                 showLicenseDialog();
-                return Promise.reject(new Error('需要提供有效的卡密才能使用'));
+                return Promise.reject(new Error('🔒 需要提供有效的卡密才能使用ComfyUI'));
             }
 
-            // 在请求中添加license_key
-            if (options.body) {
-                try {
-                    const body = JSON.parse(options.body);
-                    body.license_key = licenseKey;
-                    options.body = JSON.stringify(body);
-                } catch (e) {
-                    console.error('Error adding license key to request:', e);
-                }
-            }
+            // 会话令牌通过请求头发送，请求体保持原样，服务器无需解密卡密
+            console.log('[License] 已添加会话令牌到请求头');
+            return fetchWithLicense(this, url, options || {}, false);
         }
 
         return originalFetch.call(this, url, options);
     };
 
+    // 拦截所有交互事件
+    ['click', 'mousedown', 'keydown', 'submit'].forEach(eventType => {
+        document.addEventListener(eventType, function(e) {
+            if (!licenseKey && !e.target.closest('#licenseDialog')) {
+                if (eventType === 'keydown') {
+                    const allowedKeys = ['Tab', 'F5', 'F12', 'Escape', 'Enter'];
+                    if (allowedKeys.includes(e.key) || e.ctrlKey) return;
+                }
+                
+                console.log('[License] 拦截事件:', eventType);
+                e.preventDefault();
+                e.stopPropagation();
+                e.stopImmediatePropagation();
+                showLicenseDialog();
+                return false;
+            }
+        }, true);
+    });
+
+    // 定期检查保护状态
+    setInterval(function() {
+        if (!licenseKey) {
+            hidePageContent();
+            if (!dialogShown) {
+                showLicenseDialog();
+                dialogShown = true;
+            }
+        }
+    }, 2000);
+
     // 显示卡密输入对话框
     function showLicenseDialog() {
-        // 检查是否已经有对话框
-        if (document.getElementById('licenseDialog')) {
-            return;
+        const existingDialog = document.getElementById('licenseDialog');
+        if (existingDialog) {
+            existingDialog.remove();
         }
 
+        dialogShown = true;
+
         const dialog = document.createElement('div');
         dialog.id = 'licenseDialog';
-        dialog.innerHTML = `
-            <div style="
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background: rgba(0, 0, 0, 0.8);
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                z-index: 10000;
-            ">
-                <div style="
-                    background: white;
-                    border-radius: 15px;
-                    padding: 30px;
-                    max-width: 500px;
-                    width: 90%;
-                    box-shadow: 0 20px 40px rgba(0,0,0,0.3);
-                ">
-                    <div style="text-align: center; margin-bottom: 25px;">
-                        <div style="font-size: 48px; margin-bottom: 15px;">🔐</div>
-                        <h2 style="margin: 0; color: #333;">需要卡密验证</h2>
-                        <p style="color: #666; margin-top: 10px;">请输入您的授权卡密以继续使用ComfyUI</p>
-                    </div>
-                    
-                    <div style="margin-bottom: 20px;">
-                        <label style="display: block; margin-bottom: 8px; color: #555; font-weight: 600;">卡密:</label>
-                        <input type="text" id="licenseInput" placeholder="请输入您的卡密..." style="
-                            width: 100%;
-                            padding: 15px;
-                            border: 2px solid #e1e1e1;
-                            border-radius: 8px;
-                            font-size: 16px;
-                            box-sizing: border-box;
-                        ">
-                    </div>
-                    
-                    <div style="display: flex; gap: 15px;">
-                        <button id="validateBtn" style="
-                            flex: 1;
-                            padding: 15px 25px;
-                            border: none;
-                            border-radius: 8px;
-                            font-size: 16px;
-                            font-weight: 600;
-                            cursor: pointer;
-                            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                            color: white;
-                        ">验证卡密</button>
-                        <button id="licensePageBtn" style="
-                            flex: 1;
-                            padding: 15px 25px;
-                            border: 2px solid #e9ecef;
-                            border-radius: 8px;
-                            font-size: 16px;
-                            font-weight: 600;
-                            cursor: pointer;
-                            background: #f8f9fa;
-                            color: #6c757d;
-                        ">卡密管理</button>
-                    </div>
-                    
-                    <div id="dialogStatus" style="
-                        margin-top: 15px;
-                        padding: 10px;
-                        border-radius: 5px;
-                        text-align: center;
-                        display: none;
-                    "></div>
+        dialog.innerHTML = createDialogHTML();
+        document.body.appendChild(dialog);
+
+        setupDialogEvents(dialog);
+    }
+
+    function createDialogHTML() {
+        return `<div style="position: fixed; top: 0; left: 0; width: 100%; height: 100%; background: linear-gradient(135deg, rgba(102, 126, 234, 0.95) 0%, rgba(118, 75, 162, 0.95) 100%); display: flex; align-items: center; justify-content: center; z-index: 999999; backdrop-filter: blur(10px);">
+            <div style="background: linear-gradient(145deg, #ffffff 0%, #f8f9fa 100%); border-radius: 20px; padding: 40px; max-width: 550px; width: 90%; box-shadow: 0 25px 60px rgba(0,0,0,0.3);">
+                <div style="text-align: center; margin-bottom: 30px;">
+                    <div style="font-size: 64px; margin-bottom: 20px;">🔐</div>
+                    <h2 style="margin: 0; color: #2c3e50; font-size: 28px; font-weight: 700;">ComfyUI 授权验证</h2>
+                    <p style="color: #7f8c8d; margin: 10px 0; font-size: 16px;">请输入您的授权卡密以继续使用<br><span style="color: #e74c3c; font-weight: 600;">每次使用都需要重新验证</span></p>
+                </div>
+                <div style="margin-bottom: 25px;">
+                    <label style="display: block; margin-bottom: 12px; color: #2c3e50; font-weight: 700; font-size: 14px;">🔑 授权卡密</label>
+                    <input type="text" id="licenseInput" placeholder="请输入您的授权卡密..." style="width: 100%; padding: 18px 20px; border: 3px solid #e9ecef; border-radius: 12px; font-size: 16px; font-family: 'Courier New', monospace; box-sizing: border-box;">
+                </div>
+                <div style="display: flex; gap: 15px; margin-bottom: 20px;">
+                    <button id="validateBtn" style="flex: 2; padding: 18px 30px; border: none; border-radius: 12px; font-size: 16px; font-weight: 700; cursor: pointer; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white;">🚀 验证卡密</button>
+                    <button id="licensePageBtn" style="flex: 1; padding: 18px 25px; border: 2px solid #e9ecef; border-radius: 12px; font-size: 14px; font-weight: 600; cursor: pointer; background: #f8f9fa; color: #6c757d;">📋 管理</button>
+                </div>
+                <div id="dialogStatus" style="margin-top: 20px; padding: 15px 20px; border-radius: 10px; text-align: center; display: none; font-weight: 600; font-size: 14px;"></div>
+                <div style="margin-top: 25px; padding-top: 20px; border-top: 1px solid #e9ecef; text-align: center;">
+                    <p style="color: #95a5a6; font-size: 12px; margin: 0;">🛡️ 安全提示：每次使用都需要重新验证<br>💡 如需帮助，请联系管理员<br>⌨️ 快捷键：按 Enter 键快速验证</p>
                 </div>
             </div>
-        `;
-
-        document.body.appendChild(dialog);
+        </div>`;
+    }
 
-        // 绑定事件
+    function setupDialogEvents(dialog) {
         const input = document.getElementById('licenseInput');
         const validateBtn = document.getElementById('validateBtn');
         const licensePageBtn = document.getElementById('licensePageBtn');
         const status = document.getElementById('dialogStatus');
 
-        // 加载保存的卡密
-        if (licenseKey) {
-            input.value = licenseKey;
-        }
+        input.focus();
 
-        // 验证按钮事件
         validateBtn.onclick = async function() {
             const key = input.value.trim();
             if (!key) {
@@ -136,37 +219,42 @@
             }
 
             showDialogStatus('正在验证...', 'loading');
-            
+            validateBtn.disabled = true;
+            validateBtn.innerHTML = '⏳ 验证中...';
+
             try {
-                const response = await originalFetch('/license/validate', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ license_key: key })
-                });
+                const result = await verifyLicenseKey(key);
 
-                const result = await response.json();
-                
                 if (result.valid) {
                     licenseKey = key;
-                    localStorage.setItem('comfyui_license_key', key);
+                    setSession(result);
                     showDialogStatus('✅ 验证成功！', 'success');
+                    validateBtn.innerHTML = '🎉 验证成功';
+
                     setTimeout(() => {
-                        document.body.removeChild(dialog);
-                    }, 1500);
+                        showPageContent();
+                        dialog.style.opacity = '0';
+                        setTimeout(() => {
+                            document.body.removeChild(dialog);
+                            dialogShown = false;
+                        }, 500);
+                    }, 2000);
                 } else {
                     showDialogStatus('❌ ' + (result.message || '验证失败'), 'error');
+                    validateBtn.disabled = false;
+                    validateBtn.innerHTML = '🚀 验证卡密';
                 }
             } catch (error) {
                 showDialogStatus('❌ 验证请求失败', 'error');
+                validateBtn.disabled = false;
+                validateBtn.innerHTML = '🚀 验证卡密';
             }
         };
 
-        // 卡密管理页面按钮事件
         licensePageBtn.onclick = function() {
             window.open('/license_dialog.html', '_blank');
         };
 
-        // 回车键验证
         input.addEventListener('keypress', function(e) {
             if (e.key === 'Enter') {
                 validateBtn.click();
@@ -176,60 +264,81 @@
         function showDialogStatus(message, type) {
             status.textContent = message;
             status.style.display = 'block';
-            status.style.background = type === 'success' ? '#d4edda' : 
-                                     type === 'error' ? '#f8d7da' : '#d1ecf1';
-            status.style.color = type === 'success' ? '#155724' : 
-                                type === 'error' ? '#721c24' : '#0c5460';
-            status.style.border = type === 'success' ? '1px solid #c3e6cb' : 
-                                 type === 'error' ? '1px solid #f5c6cb' : '1px solid #bee5eb';
+
+            if (type === 'success') {
+                status.style.background = 'linear-gradient(135deg, #d4edda 0%, #c3e6cb 100%)';
+                status.style.color = '#155724';
+                status.style.border = '2px solid #27ae60';
+            } else if (type === 'error') {
+                status.style.background = 'linear-gradient(135deg, #f8d7da 0%, #f5c6cb 100%)';
+                status.style.color = '#721c24';
+                status.style.border = '2px solid #e74c3c';
+            } else {
+                status.style.background = 'linear-gradient(135deg, #d1ecf1 0%, #bee5eb 100%)';
+                status.style.color = '#0c5460';
+                status.style.border = '2px solid #3498db';
+            }
         }
     }
 
-    // 页面加载时检查卡密状态
-    document.addEventListener('DOMContentLoaded', function() {
-        if (licenseKey) {
-            // 验证已保存的卡密
-            originalFetch('/license/check', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ license_key: licenseKey })
-            }).then(response => response.json())
-            .then(result => {
-                if (!result.valid) {
-                    localStorage.removeItem('comfyui_license_key');
-                    licenseKey = '';
-                }
-            }).catch(() => {
-                // 网络错误时保持卡密
-            });
+    // 页面内容控制函数
+    function hidePageContent() {
+        if (!licenseKey) {
+            const body = document.body;
+            if (body && !body.classList.contains('license-hidden')) {
+                body.style.filter = 'blur(5px)';
+                body.style.pointerEvents = 'none';
+                body.style.userSelect = 'none';
+                body.classList.add('license-hidden');
+            }
+        }
+    }
+
+    function showPageContent() {
+        const body = document.body;
+        if (body && body.classList.contains('license-hidden')) {
+            body.style.filter = '';
+            body.style.pointerEvents = '';
+            body.style.userSelect = '';
+            body.classList.remove('license-hidden');
         }
+    }
 
-        // 添加卡密管理按钮到菜单
-        addLicenseButton();
+    // 页面加载时立即显示卡密对话框
+    document.addEventListener('DOMContentLoaded', function() {
+        if (!dialogShown) {
+            showLicenseDialog();
+            dialogShown = true;
+        }
+        hidePageContent();
     });
 
-    // 添加卡密管理按钮
-    function addLicenseButton() {
-        setTimeout(() => {
-            const menuBar = document.querySelector('.comfy-menu') || document.querySelector('#app');
-            if (menuBar && !document.getElementById('licenseMenuBtn')) {
-                const button = document.createElement('button');
-                button.id = 'licenseMenuBtn';
-                button.innerHTML = '🔐 卡密管理';
-                button.style.cssText = `
-                    margin-left: 10px;
-                    padding: 5px 10px;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    border: none;
-                    border-radius: 5px;
-                    cursor: pointer;
-                    font-size: 12px;
-                `;
-                button.onclick = () => window.open('/license_dialog.html', '_blank');
-                menuBar.appendChild(button);
+    // 页面可见性变化时重新验证
+    document.addEventListener('visibilitychange', function() {
+        if (!document.hidden) {
+            licenseKey = '';
+            sessionToken = '';
+            hidePageContent();
+            if (!dialogShown) {
+                setTimeout(() => {
+                    showLicenseDialog();
+                    dialogShown = true;
+                }, 500);
             }
-        }, 2000);
-    }
+        }
+    });
+
+    // 窗口焦点变化时重新验证
+    window.addEventListener('focus', function() {
+        licenseKey = '';
+        sessionToken = '';
+        hidePageContent();
+        if (!dialogShown) {
+            setTimeout(() => {
+                showLicenseDialog();
+                dialogShown = true;
+            }, 500);
+        }
+    });
 
 })();
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+ComfyUI License Manager 静态资源模块
+启动时将静态文件加载到内存，预先计算压缩版本和 ETag，
+仅在文件变化时重新加载，避免每次请求都读取磁盘
+"""
+
+import os
+import gzip
+import time
+import hashlib
+import mimetypes
+import threading
+from aiohttp import web
+
+try:
+    from .license_metrics import metrics
+except ImportError:
+    from license_metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 文本类型统一使用 utf-8 编码
+TEXT_CONTENT_TYPES = {
+    '.js': 'application/javascript; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.json': 'application/json; charset=utf-8',
+}
+
+
+def guess_content_type(path):
+    """根据扩展名推断 Content-Type"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in TEXT_CONTENT_TYPES:
+        return TEXT_CONTENT_TYPES[ext]
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def parse_accept_encoding(header):
+    """解析 Accept-Encoding，返回客户端接受的编码集合（忽略 q=0）"""
+    encodings = set()
+    for item in header.split(','):
+        token, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if params in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if token:
+            encodings.add(token.lower())
+    return encodings
+
+
+class StaticAsset:
+    """
+    单个内存静态资源
+    保存原始内容、gzip/brotli 压缩版本以及对应的强 ETag
+    """
+    def __init__(self, name, path, content_type=None, transform=None, reload_interval=2.0,
+                 compress_min_size=512):
+        self.name = name
+        self.path = path
+        self.content_type = content_type or guess_content_type(path)
+        self.transform = transform
+        self.reload_interval = reload_interval
+        self.compress_min_size = compress_min_size
+        # variants: 编码 -> (内容, ETag)，None 表示未压缩
+        self.variants = {}
+        self.etags = frozenset()
+        self._signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def exists(self):
+        return bool(self.variants)
+
+    def _stat_signature(self):
+        """文件的 mtime/inode/大小，用于判断是否需要重新加载"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def read(self):
+        """只读取（并转换）文件内容，不计算 ETag 和压缩版本；文件不存在时返回 None"""
+        try:
+            with open(self.path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        if self.transform is not None:
+            body = self.transform(body)
+        return body
+
+    def load(self):
+        """从磁盘读取文件并重新生成所有版本"""
+        signature = self._stat_signature()
+        body = self.read() if signature is not None else None
+        if body is None:
+            self.variants = {}
+            self.etags = frozenset()
+            self._signature = None
+            return
+
+        tag = hashlib.sha256(body).hexdigest()[:32]
+        variants = {None: (body, f'"{tag}"')}
+        if len(body) >= self.compress_min_size:
+            variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{tag}-gz"')
+            if brotli is not None:
+                variants['br'] = (brotli.compress(body), f'"{tag}-br"')
+
+        self.variants = variants
+        self.etags = frozenset(etag for _, etag in variants.values())
+        self._signature = signature
+
+    def refresh(self):
+        """按检查间隔比较文件签名，发生变化时重新加载"""
+        if self.reload_interval is None or self.reload_interval < 0:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.reload_interval
+            if self._stat_signature() != self._signature:
+                self.load()
+
+    def select(self, accept_encoding):
+        """根据 Accept-Encoding 选择最合适的版本，返回 (编码, 内容, ETag)"""
+        variants = self.variants
+        if len(variants) > 1 and accept_encoding:
+            accepted = parse_accept_encoding(accept_encoding)
+            for encoding in ('br', 'gzip'):
+                if encoding in accepted and encoding in variants:
+                    body, etag = variants[encoding]
+                    return encoding, body, etag
+        body, etag = variants[None]
+        return None, body, etag
+
+
+class AssetRegistry:
+    """
+    静态资源注册表
+
+    mode:
+        memory - 启动时加载到内存，按 ETag 协商缓存（默认）
+        disk   - 每次请求都读取磁盘并禁止缓存（旧行为）
+    """
+    def __init__(self, mode="memory", max_age=0, reload_interval=2.0, compress_min_size=512):
+        self.mode = mode
+        self.max_age = max_age
+        self.reload_interval = reload_interval
+        self.compress_min_size = compress_min_size
+        self.assets = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 license_config.json 的 static_assets 配置创建注册表"""
+        config = config or {}
+        return cls(
+            mode=config.get("mode", "memory"),
+            max_age=config.get("max_age", 0),
+            reload_interval=config.get("reload_interval", 2.0),
+            compress_min_size=config.get("compress_min_size", 512)
+        )
+
+    def register(self, name, path, content_type=None, transform=None, reload_interval=None):
+        """注册并立即加载一个资源"""
+        asset = StaticAsset(
+            name, path, content_type, transform,
+            reload_interval=self.reload_interval if reload_interval is None else reload_interval,
+            compress_min_size=self.compress_min_size
+        )
+        if self.mode != "disk":
+            asset.load()
+        self.assets[name] = asset
+        return asset
+
+    def register_directory(self, directory):
+        """注册目录下的所有文件（不递归）"""
+        if not os.path.isdir(directory):
+            return
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                self.register(filename, path)
+
+    def get(self, name):
+        """获取资源，必要时检查文件是否变化（disk 模式不加载，由 response 每次读取）"""
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        if self.mode != "disk":
+            asset.refresh()
+        return asset
+
+    def response(self, request, name):
+        """为请求构造响应：支持 If-None-Match 304 与压缩版本协商"""
+        asset = self.get(name)
+        if asset is None:
+            return web.Response(status=404)
+
+        if self.mode == "disk":
+            # 禁止缓存时用不到 ETag 和压缩版本，只读取原始内容
+            body = asset.read()
+            if body is None:
+                return web.Response(status=404)
+            metrics.static_bytes.inc(name, len(body))
+            response = web.Response(body=body)
+            response.headers['Content-Type'] = asset.content_type
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers["Pragma"] = "no-cache"
+            response.headers["Expires"] = "0"
+            return response
+
+        if not asset.exists:
+            return web.Response(status=404)
+        encoding, body, etag = asset.select(request.headers.get('Accept-Encoding', ''))
+        headers = {
+            'ETag': etag,
+            'Vary': 'Accept-Encoding',
+            'Cache-Control': f'public, max-age={self.max_age}' if self.max_age > 0 else 'no-cache',
+        }
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and self._etag_matches(if_none_match, asset.etags):
+            return web.Response(status=304, headers=headers)
+
+        headers['Content-Type'] = asset.content_type
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        metrics.static_bytes.inc(name, len(body))
+        return web.Response(body=body, headers=headers)
+
+    @staticmethod
+    def _etag_matches(if_none_match, etags):
+        """比较 If-None-Match 与资源的 ETag（弱比较）"""
+        if if_none_match.strip() == '*':
+            return True
+        for candidate in if_none_match.split(','):
+            candidate = candidate.strip()
+            if candidate.startswith('W/'):
+                candidate = candidate[2:]
+            if candidate in etags:
+                return True
+        return False
@@ -0,0 +1,242 @@
+"""
+RedisStateBackend 测试
+用进程内的 Redis 桩代替真实服务，覆盖 pipeline 批量累加、HMGET 批量读取和发布/订阅
+
+运行: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import state_backend
+from state_backend import RedisStateBackend
+from license_manager import LicenseValidator, license_digest
+
+
+class StubRedisServer:
+    """进程内的 Redis 数据：哈希表、集合和频道订阅者，多个客户端共享同一个实例即模拟多个节点"""
+    def __init__(self):
+        self.hashes = {}
+        self.sets = {}
+        self.subscribers = {}
+        self.round_trips = 0
+        self.lock = threading.Lock()
+
+
+class StubPipeline:
+    def __init__(self, client, transaction):
+        self.client = client
+        self.transaction = transaction
+        self.commands = []
+
+    def hincrby(self, key, field, amount):
+        self.commands.append((key, field, amount))
+
+    def execute(self):
+        server = self.client.server
+        server.round_trips += 1
+        with server.lock:
+            results = []
+            for key, field, amount in self.commands:
+                table = server.hashes.setdefault(key, {})
+                value = int(table.get(field, b"0")) + amount
+                table[field] = str(value).encode()
+                results.append(value)
+        return results
+
+
+class StubPubSubThread:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def stop(self):
+        self.pubsub.close()
+
+
+class StubPubSub:
+    """与 redis-py 一样在回调中传入 {"data": bytes}；消息在发布者的线程中同步投递"""
+    def __init__(self, server):
+        self.server = server
+        self.handlers = {}
+
+    def subscribe(self, **handlers):
+        self.handlers.update(handlers)
+        with self.server.lock:
+            for channel in handlers:
+                self.server.subscribers.setdefault(channel, []).append(self)
+
+    def run_in_thread(self, sleep_time=0.0, daemon=False):
+        return StubPubSubThread(self)
+
+    def deliver(self, channel, message):
+        self.handlers[channel]({"type": "message", "channel": channel.encode(), "data": message})
+
+    def close(self):
+        with self.server.lock:
+            for channel in self.handlers:
+                self.server.subscribers.get(channel, []).remove(self)
+
+
+class StubRedis:
+    """RedisStateBackend 用到的 redis.Redis 子集"""
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+
+    def hget(self, key, field):
+        self.server.round_trips += 1
+        return self.server.hashes.get(key, {}).get(field)
+
+    def hmget(self, key, fields):
+        self.server.round_trips += 1
+        table = self.server.hashes.get(key, {})
+        return [table.get(field) for field in fields]
+
+    def pipeline(self, transaction=True):
+        return StubPipeline(self, transaction)
+
+    def smembers(self, key):
+        self.server.round_trips += 1
+        return {value.encode() for value in self.server.sets.get(key, ())}
+
+    def sadd(self, key, *values):
+        self.server.round_trips += 1
+        self.server.sets.setdefault(key, set()).update(values)
+
+    def srem(self, key, *values):
+        self.server.round_trips += 1
+        self.server.sets.setdefault(key, set()).difference_update(values)
+
+    def publish(self, channel, message):
+        self.server.round_trips += 1
+        with self.server.lock:
+            subscribers = list(self.server.subscribers.get(channel, ()))
+        for pubsub in subscribers:
+            pubsub.deliver(channel, message.encode() if isinstance(message, str) else message)
+        return len(subscribers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return StubPubSub(self.server)
+
+    def close(self):
+        self.closed = True
+
+
+class RedisStateBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubRedisServer()
+        self.backend = RedisStateBackend(key_prefix="test", client=StubRedis(self.server))
+
+    def test_add_many_uses_one_pipeline(self):
+        self.assertEqual(self.backend.add_many({"a": 2, "b": 1}), {"a": 2, "b": 1})
+        self.assertEqual(self.server.round_trips, 1)
+        self.assertEqual(self.backend.add_many({"a": 3}), {"a": 5})
+        self.assertEqual(self.server.hashes["test:usage"], {"a": b"5", "b": b"1"})
+
+    def test_load_many_omits_missing(self):
+        self.backend.add_many({"a": 4, "b": 1})
+        self.server.round_trips = 0
+        self.assertEqual(self.backend.load_many(["a", "b", "c"]), {"a": 4, "b": 1})
+        self.assertEqual(self.server.round_trips, 1)
+        self.assertEqual(self.backend.load_many([]), {})
+        self.assertEqual(self.server.round_trips, 1)
+        self.assertEqual(self.backend.load("a"), 4)
+        self.assertEqual(self.backend.load("c"), 0)
+
+    def test_revocations(self):
+        self.backend.add_revocations(["digest:aa", "user:bob"])
+        self.backend.remove_revocations(["user:bob"])
+        self.backend.add_revocations([])
+        self.assertEqual(self.backend.load_revocations(), {"digest:aa"})
+
+    def test_publish_reaches_other_nodes(self):
+        other = RedisStateBackend(key_prefix="test", client=StubRedis(self.server))
+        received = []
+        other.subscribe(received.append)
+        self.backend.publish('{"type": "usage"}')
+        self.assertEqual(received, ['{"type": "usage"}'])
+
+        other.close()
+        self.backend.publish('{"type": "usage"}')
+        self.assertEqual(len(received), 1)
+        self.assertTrue(other._client.closed)
+
+
+class RedisStateSyncTest(unittest.TestCase):
+    """两个验证器通过同一个 Redis 桩同步缓存失效、吊销和使用次数"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.key = Fernet.generate_key().decode()
+        config = {
+            "encryption_key": self.key,
+            "config_reload": {"enabled": False},
+            "state_backend": {"type": "redis", "key_prefix": "test"},
+            "usage_ledger": {"flush_interval": 60},
+            "audit_log": {"enabled": False}
+        }
+        config_path = os.path.join(self.directory, "license_config.json")
+        with open(config_path, "w", encoding="utf-8") as f:
+            json.dump(config, f)
+
+        server = StubRedisServer()
+        fake_redis = mock.Mock()
+        fake_redis.Redis.from_url.side_effect = lambda url: StubRedis(server)
+        with mock.patch.object(state_backend, "redis", fake_redis):
+            self.nodes = [LicenseValidator(config_path) for _ in range(2)]
+        for node in self.nodes:
+            node.start_state_sync()
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.usage_ledger.close()
+            node.state_backend.close()
+        shutil.rmtree(self.directory)
+
+    def make_license(self, **fields):
+        data = {"user_id": "alice", "expire_time": int(time.time()) + 3600, "max_uses": -1,
+                "features": ["🎨 AI图像生成"], "current_uses": 0}
+        data.update(fields)
+        return Fernet(self.key.encode()).encrypt(json.dumps(data).encode()).decode()
+
+    def test_invalidate_clears_other_node_cache(self):
+        first, second = self.nodes
+        license_key = self.make_license()
+        digest = license_digest(license_key)
+        self.assertTrue(second.validate_license(license_key).ok)
+        self.assertIsNotNone(second.cache.get(digest))
+        first.invalidate_license(license_key)
+        self.assertIsNone(second.cache.get(digest))
+
+    def test_revoke_reaches_other_node(self):
+        first, second = self.nodes
+        license_key = self.make_license()
+        self.assertTrue(second.validate_license(license_key).ok)
+        first.revoke(["user:alice"])
+        self.assertFalse(second.validate_license(license_key).ok)
+        first.unrevoke(["user:alice"])
+        self.assertTrue(second.validate_license(license_key).ok)
+
+    def test_usage_totals_reach_other_node(self):
+        first, second = self.nodes
+        license_key = self.make_license(max_uses=2, license_id="L1")
+        self.assertTrue(second.validate_license(license_key).ok)
+        self.assertTrue(first.use_license(license_key).ok)
+        self.assertTrue(first.use_license(license_key).ok)
+        first.usage_ledger.flush()
+        self.assertEqual(second.usage_ledger.get_uses("L1"), 2)
+        self.assertFalse(second.validate_license(license_key).ok)
+
+
+if __name__ == "__main__":
+    unittest.main()
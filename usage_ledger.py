@@ -0,0 +1,131 @@
+"""
+ComfyUI License Manager 使用次数账本
+在服务器端记录许可证使用次数，取代每次使用都重新加密许可证的方案
+
+计数先累加在内存中，由后台线程按间隔批量写入共享状态后端（见 state_backend.py），
+写入后得到的最新总数通过 on_flush 广播给其他节点
+"""
+
+import atexit
+import threading
+
+
+class UsageLedger:
+    """
+    使用次数账本
+    increment_and_check 只修改内存字典，由后台线程定期批量写入后端
+    """
+    def __init__(self, backend, flush_interval=1.0, on_flush=None):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        # 写入后端后以 {license_id: 总数} 调用，用于通知其他节点
+        self.on_flush = on_flush
+        self._totals = {}  # 最近一次从后端读取/写入后的总数
+        self._pending = {}  # 尚未写入后端的增量
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _ensure_loaded(self, license_id):
+        """首次访问某个许可证时从后端读取已有次数"""
+        if license_id not in self._totals:
+            persisted = self.backend.load(license_id)
+            with self._lock:
+                self._totals.setdefault(license_id, persisted)
+
+    def missing(self, license_ids):
+        """返回尚未从后端加载的许可证标识（异步调用方据此决定是否需要在线程中 prefetch）"""
+        return {license_id for license_id in license_ids if license_id not in self._totals}
+
+    def prefetch(self, license_ids):
+        """批量读取尚未加载的许可证的已有次数（批量验证时代替逐个查询后端）"""
+        missing = self.missing(license_ids)
+        if not missing:
+            return
+        persisted = self.backend.load_many(missing)
+        with self._lock:
+            for license_id in missing:
+                self._totals.setdefault(license_id, persisted.get(license_id, 0))
+
+    def get_uses(self, license_id):
+        """获取账本中记录的使用次数（包含尚未写入的部分）"""
+        self._ensure_loaded(license_id)
+        with self._lock:
+            return self._totals[license_id] + self._pending.get(license_id, 0)
+
+    def increment_and_check(self, license_id, max_uses, base_uses=0):
+        """
+        原子地检查并增加一次使用
+        base_uses 为许可证本身携带的已用次数，max_uses 为 -1 表示不限次数
+        返回 (是否成功, 使用后的总次数)
+        """
+        self._ensure_loaded(license_id)
+        with self._lock:
+            uses = base_uses + self._totals[license_id] + self._pending.get(license_id, 0)
+            if max_uses != -1 and uses >= max_uses:
+                return False, uses
+            self._pending[license_id] = self._pending.get(license_id, 0) + 1
+        self._start()
+        return True, uses + 1
+
+    def flush(self):
+        """将内存中的增量批量写入后端"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+        try:
+            totals = self.backend.add_many(pending)
+        except Exception as e:
+            print(f"[License Validator] 使用次数写入失败: {e}")
+            # 写入失败时把增量放回，下次重试
+            with self._lock:
+                for license_id, count in pending.items():
+                    self._pending[license_id] = self._pending.get(license_id, 0) + count
+            return
+        self.apply_totals(totals)
+        if self.on_flush is not None and totals:
+            self.on_flush(totals)
+
+    def apply_totals(self, totals):
+        """合并后端中的最新总数（计数只增不减，乱序到达的旧值不会回退）"""
+        with self._lock:
+            for license_id, total in totals.items():
+                if total > self._totals.get(license_id, -1):
+                    self._totals[license_id] = total
+
+    def _start(self):
+        """首次计数时启动后台写入线程"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="license-usage-ledger", daemon=True
+                    )
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """停止后台线程并写入剩余增量"""
+        self._stop.set()
+        self.flush()
+
+
+def license_id_of(license_data, digest):
+    """
+    账本和任务配额使用的许可证标识：优先 license_id 字段，否则为卡密摘要（十六进制）
+    不使用 user_id，同一用户的多张卡密各自计数
+    """
+    return str(license_data.get('license_id') or digest.hex())
+
+
+def create_usage_ledger(config, backend):
+    """根据 license_config.json 的 usage_ledger 配置创建账本，未启用时返回 None"""
+    config = config or {}
+    if not config.get("enabled", True):
+        return None
+    return UsageLedger(backend, flush_interval=config.get("flush_interval", 1.0))
@@ -2,77 +2,128 @@
 ComfyUI License Manager Web API模块 - 完整版本
 """
 
+import asyncio
+import copy
+import hmac
+import itertools
 import json
+import math
 import os
+import threading
 from aiohttp import web
 
 try:
-    from .license_manager import license_validator
+    from .license_manager import get_license_validator, add_config_listener, LicenseStatus
+    from .static_assets import AssetRegistry
+    from .startup_timing import startup_timer
+    from .license_metrics import metrics
+    from .rate_limit import RateLimiter
+    from . import fast_json
 except ImportError:
-    from license_manager import license_validator
+    from license_manager import get_license_validator, add_config_listener, LicenseStatus
+    from static_assets import AssetRegistry
+    from startup_timing import startup_timer
+    from license_metrics import metrics
+    from rate_limit import RateLimiter
+    import fast_json
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+
+# 静态资源注册表（首次请求时创建）
+asset_registry = None
+_asset_registry_lock = threading.Lock()
+_static_files_created = False
+
+# 验证失败限流器（首次使用时按配置创建，配置重新加载后重建）
+_rate_limiter = None
+_rate_limiter_created = False
+_rate_limit_config = None
+
+def get_rate_limiter():
+    """获取验证失败限流器，未启用时返回 None"""
+    if not _rate_limiter_created:
+        configure_rate_limiter(get_license_validator().config)
+        add_config_listener(configure_rate_limiter)
+    return _rate_limiter
+
+def configure_rate_limiter(config):
+    """按 rate_limit 配置创建限流器；配置未变化时保留已有的失败计数"""
+    global _rate_limiter, _rate_limiter_created, _rate_limit_config
+    rate_limit_config = config.get("rate_limit")
+    if _rate_limiter_created and rate_limit_config == _rate_limit_config:
+        return
+    _rate_limiter = RateLimiter.from_config(rate_limit_config)
+    _rate_limit_config = copy.deepcopy(rate_limit_config)
+    _rate_limiter_created = True
+
+def check_rate_limit(request, endpoint):
+    """该地址在此端点的失败额度耗尽时返回 429 响应，否则返回 None"""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return None
+    retry_after = limiter.retry_after(request.remote, endpoint)
+    if not retry_after:
+        return None
+    return web.json_response({
+        "error": "验证失败次数过多，请稍后再试",
+        "code": "RATE_LIMITED"
+    }, status=429, headers={"Retry-After": str(math.ceil(retry_after))})
+
+# 会话令牌失效只需重新换取，不计入失败次数（校验只有一次 HMAC，不涉及解密）
+SESSION_STATUSES = (LicenseStatus.SESSION_INVALID, LicenseStatus.SESSION_EXPIRED)
+
+def record_license_failure(request, endpoint, result=None):
+    """记录一次验证失败"""
+    if result is not None and result.status in SESSION_STATUSES:
+        return
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        limiter.penalize(request.remote, endpoint)
+
+def check_admin_token(request, endpoint):
+    """
+    检查管理接口的 X-Admin-Token，通过时返回 None，否则返回拒绝响应
+    令牌读取顶层 admin_token，兼容旧配置中的 revocation.admin_token
+    """
+    config = get_license_validator().config
+    admin_token = config.get("admin_token") or config.get("revocation", {}).get("admin_token")
+    if not admin_token:
+        return web.json_response({"error": "管理接口未启用"}, status=404)
+    
+    limited = check_rate_limit(request, endpoint)
+    if limited is not None:
+        return limited
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), admin_token.encode()):
+        record_license_failure(request, endpoint)
+        return web.json_response({"error": "管理令牌无效"}, status=403)
+    return None
+
+def get_request_license_key(request):
+    """从请求头或查询参数中读取许可证密钥（不读取请求体）"""
+    config = get_license_validator().config
+    license_key = request.headers.get(config.get("license_key_header", "X-License-Key"))
+    if not license_key:
+        query_param = config.get("license_key_query_param", "license_key")
+        if query_param:
+            license_key = request.query.get(query_param)
+    return license_key.strip() if license_key else None
 
 def setup_license_routes(app):
     """设置许可证相关的路由"""
-    current_dir = os.path.dirname(__file__)
-    static_dir = os.path.join(current_dir, "static")
-    
-    # 确保目录存在
-    if not os.path.exists(static_dir):
-        os.makedirs(static_dir)
-    
-    # 创建静态文件
-    create_static_files()
-    
     # 主页卡密验证脚本注入路由
     async def get_license_injection_script(request):
         """返回用于注入主页的卡密验证脚本"""
-        script_path = os.path.join(static_dir, "license_injection.js")
-        
-        if os.path.exists(script_path):
-            with open(script_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            response = web.Response(text=content, content_type='application/javascript')
-            response.headers['Cache-Control'] = 'no-cache'
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-            return response
-        else:
-            return web.Response(status=404)
+        return get_asset_registry().response(request, "license_injection.js")
     
     # 卡密管理页面路由
     async def get_license_dialog(request):
         """返回卡密管理页面"""
-        dialog_path = os.path.join(static_dir, "license_dialog.html")
-        
-        if os.path.exists(dialog_path):
-            with open(dialog_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            response = web.Response(text=content, content_type='text/html')
-            response.headers['Cache-Control'] = 'no-cache'
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-            return response
-        else:
-            return web.Response(status=404)
+        return get_asset_registry().response(request, "license_dialog.html")
     
     # CSS文件路由
     async def get_license_css(request):
         """返回CSS样式文件"""
-        css_path = os.path.join(static_dir, "style.css")
-        
-        if os.path.exists(css_path):
-            with open(css_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            response = web.Response(text=content, content_type='text/css')
-            response.headers['Cache-Control'] = 'no-cache'
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-            return response
-        else:
-            return web.Response(status=404)
+        return get_asset_registry().response(request, "style.css")
     
     # API路由
     async def validate_license_api(request):
@@ -86,31 +137,124 @@ def setup_license_routes(app):
         if not license_key:
             return web.json_response({"error": "卡密不能为空"}, status=400)
         
-        is_valid, result = license_validator.validate_license(license_key)
+        limited = check_rate_limit(request, "/license/validate")
+        if limited is not None:
+            return limited
         
-        if is_valid:
-            license_info = result
-            message = "验证成功"
+        license_validator = get_license_validator()
+        result = await license_validator.avalidate_license(license_key)
+        license_validator.audit("validate", license_key, result, path=request.path, remote=request.remote)
+        
+        if result.ok:
+            return web.json_response({
+                "valid": True,
+                "message": result.message,
+                "code": result.code,
+                "license_info": result.data
+            })
         else:
-            license_info = None
-            message = result
+            record_license_failure(request, "/license/validate", result)
+            return web.json_response({
+                "valid": False,
+                "message": result.message,
+                "code": result.code,
+                "license_info": None
+            }, status=401)
+    
+    async def create_session_api(request):
+        """用许可证换取短期会话令牌，之后的请求携带会话令牌即可，无需再次解密许可证"""
+        license_validator = get_license_validator()
+        if not license_validator.config.get("session", {}).get("enabled", True):
+            return web.json_response({"error": "会话令牌未启用"}, status=404)
+        
+        license_key = get_request_license_key(request)
+        if not license_key:
+            try:
+                json_data = await request.json()
+                license_key = json_data.get("license_key", "").strip()
+            except Exception as e:
+                return web.json_response({"error": f"JSON解析失败: {str(e)}"}, status=400)
+        
+        if not license_key:
+            return web.json_response({"error": "卡密不能为空"}, status=400)
+        
+        limited = check_rate_limit(request, "/license/session")
+        if limited is not None:
+            return limited
         
-        if is_valid:
+        result = await license_validator.acreate_session(license_key)
+        
+        if result.ok:
             return web.json_response({
                 "valid": True,
-                "message": message,
-                "license_info": license_info
+                "message": result.message,
+                "code": result.code,
+                "session_token": result.data["session_token"],
+                "expires_at": result.data["expires_at"],
+                "license_info": result.data["license_info"]
             })
         else:
+            record_license_failure(request, "/license/session", result)
             return web.json_response({
                 "valid": False,
-                "message": message,
-                "license_info": license_info
+                "message": result.message,
+                "code": result.code,
+                "license_info": None
             }, status=401)
     
+    async def validate_license_batch_api(request):
+        """批量验证卡密API（需要 X-Admin-Token），结果顺序与请求一致，数量较多时以NDJSON流式返回"""
+        rejected = check_admin_token(request, "/license/validate_batch")
+        if rejected is not None:
+            return rejected
+        
+        try:
+            json_data = fast_json.loads(await request.read())
+            license_keys = json_data.get("license_keys") if isinstance(json_data, dict) else json_data
+            if not isinstance(license_keys, list):
+                raise ValueError("license_keys 必须是数组")
+        except Exception as e:
+            return web.json_response({"error": f"JSON解析失败: {str(e)}"}, status=400)
+        
+        license_validator = get_license_validator()
+        batch_config = license_validator.config.get("batch", {})
+        max_keys = batch_config.get("max_keys", 100000)
+        if len(license_keys) > max_keys:
+            return web.json_response({"error": f"单次最多验证 {max_keys} 个卡密"}, status=413)
+        
+        license_keys = [key.strip() if isinstance(key, str) else "" for key in license_keys]
+        
+        def batch_item(index, result):
+            if result.ok:
+                return {"index": index, "valid": True, "code": result.code, "license_info": result.data}
+            return {"index": index, "valid": False, "code": result.code, "message": result.message}
+        
+        stream = (
+            len(license_keys) > batch_config.get("stream_threshold", 1000)
+            or "application/x-ndjson" in request.headers.get("Accept", "")
+        )
+        if not stream:
+            results = await license_validator.avalidate_many(license_keys)
+            return web.json_response({
+                "results": [batch_item(index, result) for index, result in enumerate(results)]
+            })
+        
+        # 分批验证并逐行写出，内存占用只与批大小有关
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        chunk_size = batch_config.get("chunk_size", 256)
+        for start in range(0, len(license_keys), chunk_size):
+            results = await license_validator.avalidate_many(license_keys[start:start + chunk_size])
+            await response.write(b"".join(
+                fast_json.dumps(batch_item(start + offset, result)) + b"\n"
+                for offset, result in enumerate(results)
+            ))
+        await response.write_eof()
+        return response
+    
     async def get_license_config(request):
         """获取许可证配置信息"""
-        config_info = license_validator.get_config_info()
+        config_info = get_license_validator().get_config_info()
         return web.json_response(config_info)
     
     async def check_license_info(request):
@@ -124,12 +268,92 @@ def setup_license_routes(app):
         if not license_key:
             return web.json_response({"error": "卡密不能为空"}, status=400)
         
-        is_valid, result = license_validator.get_license_info(license_key)
+        limited = check_rate_limit(request, "/license/info")
+        if limited is not None:
+            return limited
+        
+        result = await get_license_validator().aget_license_info(license_key)
         
-        if is_valid:
-            return web.json_response(result)
+        if result.ok:
+            return web.json_response(result.data)
         else:
-            return web.json_response({"error": result}, status=400)
+            record_license_failure(request, "/license/info", result)
+            return web.json_response({"error": result.message, "code": result.code}, status=400)
+    
+    async def manage_revocations(request):
+        """吊销管理接口：POST 吊销，DELETE 撤销吊销，GET 查看数量（需要 X-Admin-Token）"""
+        rejected = check_admin_token(request, "/license/admin/revocations")
+        if rejected is not None:
+            return rejected
+        
+        license_validator = get_license_validator()
+        revocations = license_validator.revocations
+        if request.method == "GET":
+            return web.json_response({
+                "digests": len(revocations.digests),
+                "user_ids": len(revocations.user_ids)
+            })
+        
+        try:
+            json_data = await request.json()
+            entries = list(json_data.get("entries", []))
+            entries.extend(json_data.get("license_keys", []))
+            entries.extend(f"user:{user_id}" for user_id in json_data.get("user_ids", []))
+            if request.method == "DELETE":
+                changed = license_validator.unrevoke(entries)
+            else:
+                changed = license_validator.revoke(entries)
+        except Exception as e:
+            return web.json_response({"error": f"请求格式错误: {str(e)}"}, status=400)
+        
+        return web.json_response({
+            "count": len(changed),
+            "entries": changed,
+            "total": len(revocations)
+        })
+    
+    async def query_audit_log(request):
+        """
+        按时间范围查询审计日志（需要 X-Admin-Token），以 NDJSON 流式返回
+        查询参数：since/until（Unix 时间戳，秒）、limit、event、user_id、license
+        """
+        rejected = check_admin_token(request, "/license/admin/audit")
+        if rejected is not None:
+            return rejected
+        
+        audit_log = get_license_validator().audit_log
+        if audit_log is None:
+            return web.json_response({"error": "审计日志未启用"}, status=404)
+        
+        try:
+            since = float(request.query["since"]) if "since" in request.query else None
+            until = float(request.query["until"]) if "until" in request.query else None
+            limit = int(request.query.get("limit", 1000))
+        except ValueError as e:
+            return web.json_response({"error": f"查询参数错误: {str(e)}"}, status=400)
+        filters = {key: request.query[key] for key in ("event", "user_id", "license") if key in request.query}
+        
+        # 先写入缓冲区中尚未落盘的事件，文件读取放在线程池中，每次读取一批
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, audit_log.flush)
+        events = itertools.islice(audit_log.query(since, until, **filters), max(limit, 0))
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        while True:
+            batch = await loop.run_in_executor(None, lambda: list(itertools.islice(events, 256)))
+            if not batch:
+                break
+            await response.write(b"".join(fast_json.dumps(event) + b"\n" for event in batch))
+        await response.write_eof()
+        return response
+    
+    async def get_license_metrics(request):
+        """以 Prometheus 文本格式返回运行指标"""
+        return web.Response(
+            text=metrics.render(get_license_validator()),
+            content_type='text/plain',
+            headers={'Cache-Control': 'no-cache'}
+        )
     
     # 添加路由
     app.router.add_get('/license_injection.js', get_license_injection_script)
@@ -137,33 +361,71 @@ def setup_license_routes(app):
     app.router.add_get('/license_static/style.css', get_license_css)
     
     app.router.add_post('/license/validate', validate_license_api)
+    app.router.add_post('/license/validate_batch', validate_license_batch_api)
+    app.router.add_post('/license/session', create_session_api)
     app.router.add_get('/license/config', get_license_config)
     app.router.add_post('/license/info', check_license_info)
+    app.router.add_get('/license/metrics', get_license_metrics)
+    app.router.add_get('/license/admin/revocations', manage_revocations)
+    app.router.add_post('/license/admin/revocations', manage_revocations)
+    app.router.add_delete('/license/admin/revocations', manage_revocations)
+    app.router.add_get('/license/admin/audit', query_audit_log)
+
+def get_asset_registry():
+    """获取静态资源注册表（首次调用时生成静态文件并加载到内存）"""
+    global asset_registry
+    if asset_registry is None:
+        with _asset_registry_lock:
+            if asset_registry is None:
+                create_static_files()
+                with startup_timer.phase("加载静态资源"):
+                    registry = AssetRegistry.from_config(get_license_validator().config.get("static_assets"))
+                    registry.register_directory(STATIC_DIR)
+                asset_registry = registry
+    return asset_registry
+
+def write_if_changed(path, content):
+    """内容与磁盘上的文件不同时才写入，返回是否写入"""
+    data = content.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
 
 def create_static_files():
-    """创建所有必要的静态文件"""
-    current_dir = os.path.dirname(__file__)
-    static_dir = os.path.join(current_dir, "static")
+    """创建所有必要的静态文件（每个进程只执行一次）"""
+    global _static_files_created
+    if _static_files_created:
+        return
+    _static_files_created = True
     
-    # 确保目录存在
-    if not os.path.exists(static_dir):
-        os.makedirs(static_dir)
-    
-    # 创建完整的JavaScript注入脚本
-    js_content = create_license_injection_script()
-    
-    js_path = os.path.join(static_dir, "license_injection.js")
-    with open(js_path, 'w', encoding='utf-8') as f:
-        f.write(js_content)
-    
-    # 创建CSS样式文件
-    css_content = create_css_styles()
-    
-    css_path = os.path.join(static_dir, "style.css")
-    with open(css_path, 'w', encoding='utf-8') as f:
-        f.write(css_content)
+    with startup_timer.phase("生成静态文件"):
+        try:
+            # 确保目录存在
+            if not os.path.exists(STATIC_DIR):
+                os.makedirs(STATIC_DIR)
+            
+            # 创建完整的JavaScript注入脚本和CSS样式文件
+            written = [
+                name for name, content in (
+                    ("license_injection.js", create_license_injection_script()),
+                    ("style.css", create_css_styles()),
+                )
+                if write_if_changed(os.path.join(STATIC_DIR, name), content)
+            ]
+        except OSError as e:
+            # 只读镜像中保留已有文件
+            print(f"[ComfyUI-License-Manager] 警告: 静态文件无法写入，使用现有文件 - {e}")
+            return
     
-    print("[ComfyUI-License-Manager] 静态文件已创建")
+    if written:
+        print(f"[ComfyUI-License-Manager] 静态文件已更新: {', '.join(written)}")
 
 def create_license_injection_script():
     """创建许可证注入脚本"""
@@ -173,8 +435,102 @@ def create_license_injection_script():
 
     let originalFetch = window.fetch;
     let licenseKey = '';  // 不从localStorage读取，每次都需要重新输入
+    let sessionToken = '';  // 用卡密换取的短期会话令牌，请求时代替卡密发送
+    let sessionExpires = 0;
+    let sessionRequest = null;
+    let sessionsEnabled = true;  // 服务器关闭会话令牌（/license/session 返回404）后直接发送卡密
     let dialogShown = false;
 
+    // 保存 /license/session 的返回结果
+    function setSession(result) {
+        sessionToken = result.session_token || '';
+        sessionExpires = result.expires_at || 0;
+    }
+
+    // 获取有效的会话令牌，快过期时重新换取；会话不可用时退回发送卡密
+    function getSessionToken() {
+        if (!sessionsEnabled) {
+            return Promise.resolve(licenseKey);
+        }
+        if (sessionToken && sessionExpires - Date.now() / 1000 > 30) {
+            return Promise.resolve(sessionToken);
+        }
+        if (!sessionRequest) {
+            sessionRequest = originalFetch('/license/session', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ license_key: licenseKey })
+            }).then(response => {
+                if (response.status === 404) {
+                    sessionsEnabled = false;
+                }
+                return response.json();
+            }).then(result => {
+                if (result.valid) {
+                    setSession(result);
+                } else {
+                    sessionToken = '';
+                }
+                return sessionToken || licenseKey;
+            }).catch(() => licenseKey).finally(() => {
+                sessionRequest = null;
+            });
+        }
+        return sessionRequest;
+    }
+
+    // 验证卡密：优先换取会话令牌，会话接口未启用或出错时改用 /license/validate
+    async function verifyLicenseKey(key) {
+        const body = JSON.stringify({ license_key: key });
+        if (sessionsEnabled) {
+            try {
+                const response = await originalFetch('/license/session', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: body
+                });
+                if (response.status === 404) {
+                    sessionsEnabled = false;
+                }
+                const result = await response.json();
+                // 只有验证结果（含 valid 字段）直接返回，其余错误退回普通验证
+                if (typeof result.valid === 'boolean') {
+                    return result;
+                }
+            } catch (error) {
+                console.log('[License] 会话接口不可用，改用普通验证:', error);
+            }
+        }
+        const response = await originalFetch('/license/validate', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: body
+        });
+        return response.json();
+    }
+
+    // 携带会话令牌发送请求，会话失效时重新换取并重试一次
+    function fetchWithLicense(target, url, options, retried) {
+        return getSessionToken().then(token => {
+            const headers = new Headers(options.headers || {});
+            headers.set('X-License-Key', token);
+            return originalFetch.call(target, url, Object.assign({}, options, { headers: headers })).then(response => {
+                if (response.status !== 401 || retried || token === licenseKey) {
+                    return response;
+                }
+                return response.clone().json().then(result => {
+                    const reason = result.reason || result.code || '';
+                    if (reason.indexOf('LICENSE_SESSION') !== 0) {
+                        return response;
+                    }
+                    console.log('[License] 会话已失效，重新换取');
+                    sessionToken = '';
+                    return fetchWithLicense(target, url, options, true);
+                }, () => response);
+            });
+        });
+    }
+
     // 重写fetch函数来拦截所有请求
     window.fetch = function(url, options) {
         console.log('[License] 拦截请求:', url, options?.method);
@@ -199,20 +555,9 @@ def create_license_injection_script():
                 return Promise.reject(new Error('🔒 需要提供有效的卡密才能使用ComfyUI'));
             }
 
-            if (options && options.body) {
-                try {
-                    const body = JSON.parse(options.body);
-                    body.license_key = licenseKey;
-                    options.body = JSON.stringify(body);
-                    console.log('[License] 已添加卡密到请求');
-                } catch (e) {
-                    console.error('[License] 添加卡密失败:', e);
-                }
-            } else if (options) {
-                options.body = JSON.stringify({ license_key: licenseKey });
-                options.headers = options.headers || {};
-                options.headers['Content-Type'] = 'application/json';
-            }
+            // 会话令牌通过请求头发送，请求体保持原样，服务器无需解密卡密
+            console.log('[License] 已添加会话令牌到请求头');
+            return fetchWithLicense(this, url, options || {}, false);
         }
 
         return originalFetch.call(this, url, options);
@@ -266,7 +611,7 @@ def create_license_injection_script():
     }
 
     function createDialogHTML() {
-        return \`<div style="position: fixed; top: 0; left: 0; width: 100%; height: 100%; background: linear-gradient(135deg, rgba(102, 126, 234, 0.95) 0%, rgba(118, 75, 162, 0.95) 100%); display: flex; align-items: center; justify-content: center; z-index: 999999; backdrop-filter: blur(10px);">
+        return `<div style="position: fixed; top: 0; left: 0; width: 100%; height: 100%; background: linear-gradient(135deg, rgba(102, 126, 234, 0.95) 0%, rgba(118, 75, 162, 0.95) 100%); display: flex; align-items: center; justify-content: center; z-index: 999999; backdrop-filter: blur(10px);">
             <div style="background: linear-gradient(145deg, #ffffff 0%, #f8f9fa 100%); border-radius: 20px; padding: 40px; max-width: 550px; width: 90%; box-shadow: 0 25px 60px rgba(0,0,0,0.3);">
                 <div style="text-align: center; margin-bottom: 30px;">
                     <div style="font-size: 64px; margin-bottom: 20px;">🔐</div>
@@ -286,7 +631,7 @@ def create_license_injection_script():
                     <p style="color: #95a5a6; font-size: 12px; margin: 0;">🛡️ 安全提示：每次使用都需要重新验证<br>💡 如需帮助，请联系管理员<br>⌨️ 快捷键：按 Enter 键快速验证</p>
                 </div>
             </div>
-        </div>\`;
+        </div>`;
     }
 
     function setupDialogEvents(dialog) {
@@ -309,16 +654,11 @@ def create_license_injection_script():
             validateBtn.innerHTML = '⏳ 验证中...';
 
             try {
-                const response = await originalFetch('/license/validate', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ license_key: key })
-                });
-
-                const result = await response.json();
+                const result = await verifyLicenseKey(key);
 
                 if (result.valid) {
                     licenseKey = key;
+                    setSession(result);
                     showDialogStatus('✅ 验证成功！', 'success');
                     validateBtn.innerHTML = '🎉 验证成功';
 
@@ -408,6 +748,7 @@ def create_license_injection_script():
     document.addEventListener('visibilitychange', function() {
         if (!document.hidden) {
             licenseKey = '';
+            sessionToken = '';
             hidePageContent();
             if (!dialogShown) {
                 setTimeout(() => {
@@ -421,6 +762,7 @@ def create_license_injection_script():
     // 窗口焦点变化时重新验证
     window.addEventListener('focus', function() {
         licenseKey = '';
+        sessionToken = '';
         hidePageContent();
         if (!dialogShown) {
             setTimeout(() => {
@@ -460,6 +802,3 @@ body {
     max-width: 600px;
     margin: 20px;
 }'''
-
-# 在模块加载时创建静态文件
-create_static_files()